@@ -168,6 +168,31 @@ class LLMConfig(BaseModel):
 
     max_retry: int = 3
 
+    # 单条投稿内图片（下载、压缩、审核）的最大并发数
+    image_concurrency: int = 8
+
+    # 压缩后调用 jpegoptim/optipng 二次优化图片（未安装对应工具时自动跳过）
+    postprocess_optimize: bool = True
+
+    # 投稿分析使用 response_format=json_object 的非流式调用；服务端不支持时设为 False 回退流式调用
+    json_mode: bool = True
+
+    # 图片审核要求 Vision 模型以 JSON 返回 {"safe", "description"}（需服务端支持 response_format）
+    vision_json_mode: bool = False
+
+    # 相同投稿输入的分析结果缓存有效期（秒），0 表示不缓存（默认）
+    # isover 依赖当前时间判断，缓存键按分钟分桶；审核指令“等”“刷新”始终重新分析
+    analysis_cache_ttl: int = 0
+
+    # 不超过该条数且全部为已审核安全图片的投稿跳过 LLM 分析，直接按缺省结果处理；0 表示关闭
+    fast_path_max_messages: int = 0
+
+    # 所有 LLM 调用（图片审核与投稿分析）的最大并发数
+    llm_concurrency: int = 8
+
+    # 所有 LLM 调用的每分钟请求数上限，0 表示不限速
+    llm_rpm: int = 60
+
     @validator('api_key', pre=True)
     def get_api_key_from_env(cls, v):
         """从环境变量获取API密钥"""
@@ -212,6 +237,9 @@ class RenderingConfig(BaseModel):
     # 静态资源基础 URL (可以是本地路径或远程 URL)
     # 例如: "file:///path/to/static" 或 "https://raw.githubusercontent.com/user/repo/branch"
     static_base_url: str = "file://./static"
+    
+    # 是否将 QQ 表情内联为 data URI；关闭后直接引用表情文件（需渲染端可访问）
+    inline_faces: bool = True
 
 
  
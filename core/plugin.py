@@ -8,6 +8,9 @@ from config import Settings
 
 class Plugin(ABC):
     """插件基类"""
+
+    # 声明了 __slots__ 的子类可完全不带实例 __dict__；未声明的子类行为不变
+    __slots__ = ('name', 'config', 'enabled', 'logger')
     
     def __init__(self, name: str, config: Dict[str, Any]):
         self.name = name
@@ -106,6 +109,8 @@ class PublisherPlugin(Plugin):
 
 class ProcessorPlugin(Plugin):
     """处理器插件基类"""
+
+    __slots__ = ()
     
     @abstractmethod
     async def process(self, data: Dict[str, Any]) -> Dict[str, Any]:
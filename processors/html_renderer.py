@@ -1,53 +1,241 @@
 """HTML渲染器"""
+import asyncio
+import functools
+import hashlib
+import html as _stdhtml
 import json
+import math
+import random
+import tempfile
+import time
+import unicodedata
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
-from jinja2 import Template
+from jinja2 import Environment, StrictUndefined, Template
+from markupsafe import Markup
 import os
 import mimetypes
 import re
-import base64
-from io import BytesIO
-from urllib.parse import quote
-from linkify_it import LinkifyIt
-from humanfriendly import format_size
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from urllib.parse import quote, urlparse
+from urllib.request import url2pathname
 
-import qrcode
+import segno
+
+# 优先使用 SIMD 加速的 pybase64（输出与标准库一致），未安装时回退标准库
+try:
+    from pybase64 import b64encode
+except ImportError:
+    from base64 import b64encode
 
 from core.plugin import ProcessorPlugin
 from config.settings import get_settings
 
 
-class HTMLRenderer(ProcessorPlugin):
-    """HTML渲染器，将消息渲染为HTML页面"""
-    
-    def __init__(self):
-        super().__init__("html_renderer", {})
-        self.settings = get_settings()
-        self.template = self.load_template()
-        # 初始化 LinkifyIt
-        self._linkify = LinkifyIt()
-        
-    async def initialize(self):
-        """初始化渲染器"""
-        self.logger.info("HTML渲染器初始化完成")
-        
-    async def shutdown(self):
-        """关闭渲染器"""
-        pass
-        
-    async def process(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """渲染HTML"""
-        html = await self.render_html(data)
-        data['rendered_html'] = html
-        # 暴露在渲染过程中收集到的链接，供后续流程（发布时附带）使用
-        data['extracted_links'] = getattr(self, '_collected_links', [])
-        return data
-        
-    def load_template(self) -> Template:
-        """加载HTML模板"""
-        template_str = '''<!DOCTYPE html>
+# 页面尺寸估算参数（96 DPI 下的像素值），用于在服务端直接生成 @page 规则
+PX_PER_INCH = 96
+PAGE_MIN_INCH = 4.0
+PAGE_MAX_INCH = 24.0
+PAGE_CHROME_PX = 180          # 头部、页脚与容器内边距
+BUBBLE_LINE_PX = 40           # 文本气泡每行高度
+BUBBLE_LINE_CHARS = 20        # 4in 宽度下每行可容纳的大致字符数
+IMAGE_BLOCK_PX = 320          # 图片/视频块（max-height 300px + 间距）
+FILE_BLOCK_PX = 140
+CARD_BLOCK_PX = 140
+STICKER_BLOCK_PX = 130
+FORWARD_TITLE_PX = 30
+REPLY_BLOCK_PX = 70
+CONTAINER_WIDTH_PX = 384      # .container 宽度（4in，border-box）
+
+# 水印参数：平铺间距、字号、旋转角度与抖动幅度（像素）；平铺图块宽为 CONTAINER_WIDTH_PX
+WATERMARK_OPACITY = 0.12
+WATERMARK_ANGLE = 24
+WATERMARK_FONT_PX = 40
+WATERMARK_TILE_PX = 480
+WATERMARK_JITTER_PX = 10
+WATERMARK_NARROW_CHAR_EM = 0.55   # 半角字符的大致宽度（相对字号）
+
+# 文件大小单位（十进制，1000 进位）
+SIZE_UNITS = ('KB', 'MB', 'GB', 'TB', 'PB', 'EB')
+
+# QQ 表情资源目录与文件名模式
+FACE_DIR_CANDIDATES = ('static/qlottie', 'qlottie')
+FACE_NAME_PATTERNS = ('{}.png', '{}.webp', '{}.gif', 'face_{}.png', 'sticker_{}.png')
+
+# HTML 转义表（与 html.escape(quote=True) 等价，单次 C 层遍历完成替换）
+HTML_ESCAPE_TABLE = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#x27;',
+})
+
+# 是否含需要 HTML 转义的字符
+HTML_SPECIAL_SEARCH = re.compile(r'[&<>"\']').search
+
+# 文本转义表：在 HTML 转义的基础上把换行转为 <br>
+HTML_TEXT_ESCAPE_TABLE = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#x27;',
+    '\n': '<br>',
+})
+
+# 链接识别：URL（http/https 或 www. 开头）与邮箱合并为一个正则，单次扫描完成；
+# 仅匹配 ASCII 字符，避免把紧随其后的中文吞进链接
+LINK_RE = re.compile(
+    r"(?P<url>(?:https?://|www\.)[\w\-.~:/?#\[\]@!$&'()*+,;=%]*[\w\-~/#=&%+])"
+    r"|(?P<mail>[\w.+-]+@[\w-]+(?:\.[\w-]+)+)",
+    re.ASCII,
+)
+
+# 联系人卡片文本中的 QQ 号（可带 uin= 前缀）
+UIN_RE = re.compile(r'(?:uin=)?(?P<uin>\d{5,})')
+
+# 文本链接化：在 LINK_RE 基础上追加需转义字符（含换行）的分支，一次 re.sub 同时完成转义与链接替换
+LINKIFY_RE = re.compile(LINK_RE.pattern + r"|(?P<esc>[&<>\"'\n]+)", re.ASCII)
+
+# 批量渲染卡片时并发生成二维码的线程数
+QR_BATCH_WORKERS = 4
+
+# 二维码磁盘缓存子目录（位于 system.cache_dir 下）
+QR_CACHE_SUBDIR = 'qr_codes'
+
+# 本地图片 data URI 缓存条目数（投稿图片可能较大，保持较小的上限）
+IMAGE_DATA_URI_CACHE_SIZE = 64
+
+# 本地静态模式下于初始化时预编码为 data URI 的资源子目录（戳一戳图标、文件图标）
+STATIC_ASSET_DIRS = ('source', 'file')
+
+# 扩展名 -> MIME（覆盖内联资源的常见类型，命中时无需加载系统 mimetypes 数据库）
+EXT_MIME_MAP = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+    '.bmp': 'image/bmp',
+    '.svg': 'image/svg+xml',
+    '.ico': 'image/vnd.microsoft.icon',
+    '.mp4': 'video/mp4',
+}
+
+# 文件扩展名 -> 文件图标（只读映射）
+FILE_ICON_MAP = MappingProxyType({
+    '.doc': 'doc.png',
+    '.docx': 'doc.png',
+    '.pdf': 'pdf.png',
+    '.xls': 'xls.png',
+    '.xlsx': 'xls.png',
+    '.ppt': 'ppt.png',
+    '.pptx': 'ppt.png',
+    '.zip': 'zip.png',
+    '.rar': 'rar.png',
+    '.txt': 'txt.png',
+    '.mp3': 'audio.png',
+    '.mp4': 'video.png',
+    '.jpg': 'image.png',
+    '.png': 'image.png',
+    '.gif': 'image.png',
+})
+
+# 找不到表情时使用的透明占位（1x1 PNG）
+TRANSPARENT_PNG_DATA_URI = (
+    'data:image/png;base64,'
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAA'
+    'AAC0lEQVR42mP8/x8AAwMCAO2e4eYAAAAASUVORK5CYII='
+)
+
+# 消息片段 HTML 模板（去除多余空白，以 format_map 填充）
+BUBBLE_FMT = '<div class="bubble">{text}</div>'
+IMAGE_FMT = '<img src="{src}" alt="Image">'
+VIDEO_FMT = (
+    '<video controls autoplay muted><source src="{src}" type="video/mp4">'
+    'Your browser does not support the video tag.</video>'
+)
+FILE_BLOCK_FMT = (
+    '<div class="file-block"><img class="file-icon" src="{icon}" alt="File Icon">'
+    '<div class="file-info"><a class="file-name" href="{href}" download>{name}</a>'
+    '<div class="file-meta">{size}</div></div></div>'
+)
+FACE_FMT = '<img class="{css_class}" src="{src}" alt="{alt}">'
+POKE_HTML = '<img class="poke-icon" src="@/source/poke.png" alt="戳一戳">'
+FORWARD_OPEN_HTML = '<div class="forward-title">合并转发聊天记录</div>\n<div class="forward">'
+REPLY_FMT = (
+    '<div class="reply" data-mid="{mid}"><div class="reply-meta">{meta}</div>'
+    '<div class="reply-body">{body}</div></div>'
+)
+# 链接锚点：预绑定 str.format，参数为 (已转义的 href, 已转义的文字)
+_format_anchor = '<a href="{0}" target="_blank" rel="noopener noreferrer">{1}</a>'.format
+
+
+def _is_sticker_face_type(face_type: Any) -> bool:
+    """判断是否为“大表情/贴纸”：faceType >= 2 视为大表情"""
+    if isinstance(face_type, str):
+        face_type = face_type.strip()
+        if not face_type.isdigit():
+            return False
+        face_type = int(face_type)
+    return isinstance(face_type, (int, float)) and face_type >= 2
+
+
+def _guess_image_mime(path: str) -> str:
+    """按扩展名确定 MIME：先查静态表，未命中再交给 mimetypes，仍未知时按 png 处理"""
+    mime = EXT_MIME_MAP.get(os.path.splitext(path)[1].lower())
+    if mime is None:
+        mime = mimetypes.guess_type(path)[0] or 'image/png'
+    return mime
+
+
+@functools.lru_cache(maxsize=512)
+def _find_face_file(face_id: str, face_dirs: Tuple[str, ...]) -> Optional[str]:
+    """在表情目录中查找 face_id 对应的图片文件路径（基于目录文件名索引，无需逐个 stat）"""
+    for d, names in _face_dir_index(face_dirs):
+        for pattern in FACE_NAME_PATTERNS:
+            name = pattern.format(face_id)
+            if name in names:
+                return os.path.join(d, name)
+    return None
+
+
+@functools.lru_cache(maxsize=8)
+def _face_dir_index(face_dirs: Tuple[str, ...]) -> Tuple[Tuple[str, frozenset], ...]:
+    """列出各表情目录下的文件名，返回 ((目录, 文件名集合), ...)"""
+    index = []
+    for d in face_dirs:
+        try:
+            with os.scandir(d) as it:
+                names = frozenset(entry.name for entry in it if entry.is_file())
+        except OSError:
+            continue
+        index.append((d, names))
+    return tuple(index)
+
+
+@functools.lru_cache(maxsize=512)
+def _load_face_data_uri(face_id: str, face_dirs: Tuple[str, ...]) -> str:
+    """将 face_id 对应的图片编码为 data URI（进程内共享的有界缓存）"""
+    path = _find_face_file(face_id, face_dirs)
+    if path:
+        try:
+            with open(path, 'rb') as f:
+                b64 = b64encode(f.read()).decode('ascii')
+        except OSError:
+            return TRANSPARENT_PNG_DATA_URI
+        mime = _guess_image_mime(path)
+        return f"data:{mime};base64,{b64}"
+    # 找不到时返回透明占位，未命中结果同样被缓存
+    return TRANSPARENT_PNG_DATA_URI
+
+
+# 页面静态头部（样式表）：与单次渲染无关，按渲染设置预渲染一次
+PAGE_HEAD_TEMPLATE = '''<!DOCTYPE html>
 <html lang="zh">
 <head>
     <meta charset="UTF-8">
@@ -110,11 +298,6 @@ class HTMLRenderer(ProcessorPlugin):
 
         * { box-sizing: border-box; }
 
-        @page {
-            margin: 0 !important;
-            size: 4in 8in;
-        }
-
         body {
             font-family: var(--font-family);
             background-color: var(--background-color);
@@ -372,25 +555,17 @@ class HTMLRenderer(ProcessorPlugin):
         .wm-overlay {
             position: absolute;
             inset: 0;
+            overflow: hidden;
             pointer-events: none;
+            user-select: none;
             z-index: 999;
+            background-repeat: repeat-y;
+            background-position: center top;
+            mix-blend-mode: multiply;
             -webkit-print-color-adjust: exact;
             print-color-adjust: exact;
         }
-
-        .wm-item {
-            position: absolute;
-            white-space: nowrap;
-            user-select: none;
-            font-family: var(--font-family);
-            font-weight: 500;
-            color: rgba(0, 0, 0, 1);
-            text-shadow: 0 0 1px rgba(255, 255, 255, 0.25);
-            transform: rotate(-24deg);
-            line-height: 1;
-            mix-blend-mode: multiply;
-        }
-        @media print { .wm-item { mix-blend-mode: normal; } }
+        @media print { .wm-overlay { mix-blend-mode: normal; } }
 
         .footer {
             margin-top: var(--spacing-xxl);
@@ -411,6 +586,15 @@ class HTMLRenderer(ProcessorPlugin):
             color: var(--text-muted);
         }
     </style>
+'''
+
+# 页面动态部分：页面尺寸与正文，每次渲染经 Jinja 处理
+PAGE_BODY_TEMPLATE = '''    <style>
+        @page {
+            margin: 0 !important;
+            size: 4in {{ page_size }}in;
+        }
+    </style>
 </head>
 <body>
     <div class="container">
@@ -424,141 +608,371 @@ class HTMLRenderer(ProcessorPlugin):
             </div>
         </div>
         <div class="content">
-            {{ content_html | safe }}
+            {{ content_html }}
         </div>
         <div class="footer">
             <div class="brand">{{ wall_mark }}</div>
             <div class="timestamp">{{ render_time }}</div>
         </div>
+        {% if watermark_style %}
+        <div class="wm-overlay" style="{{ watermark_style }}"></div>
+        {% endif %}
     </div>
-    <script>
-        window.onload = function () {
-            const container = document.querySelector('.container');
-            const contentHeight = container.scrollHeight;
-            const pageHeight4in = 364; // 4 inches = 96px * 4
-
-            let pageSize = '';
-            if (contentHeight <= pageHeight4in) {
-                pageSize = '4in 4in';
-            } else if (contentHeight >= 2304) {
-                pageSize = '4in 24in';
-            } else {
-                const containerHeightInInches = (contentHeight / 96 + 0.1).toFixed(2);
-                pageSize = '4in ' + containerHeightInInches + 'in';
-            }
-
-            const style = document.createElement('style');
-            style.innerHTML = '@page { size: ' + pageSize + '; margin: 0 !important; }';
-            document.head.appendChild(style);
-
-            const watermarkText = "{{ watermark_text }}";
-            if (watermarkText && watermarkText.trim() !== '') {
-              addWatermark({
-                text: watermarkText,
-                opacity: 0.12,
-                angle: 24,
-                fontSize: 40,
-                tile: 480,
-                jitter: 10
-              });
-            }
-
-            function addWatermark(opts) {
-                const container = document.querySelector('.container');
-
-                let overlay = container.querySelector('.wm-overlay');
-                if (!overlay) {
-                    overlay = document.createElement('div');
-                    overlay.className = 'wm-overlay';
-                    container.appendChild(overlay);
-                } else {
-                    overlay.innerHTML = '';
-                }
-
-                const W = container.clientWidth;
-                const H = container.scrollHeight; // 高度按内容
-                overlay.style.width = W + 'px';
-                overlay.style.height = H + 'px';
-
-                const text = String(opts.text);
-                const opacity = (typeof opts.opacity === 'number') ? opts.opacity : 0.12;
-                const angle = Number.isFinite(opts.angle) ? opts.angle : 24;
-                const fontSize = Number.isFinite(opts.fontSize) ? opts.fontSize : 40;
-                const tile = Number.isFinite(opts.tile) ? opts.tile : 480;
-                const jitter = Number.isFinite(opts.jitter) ? opts.jitter : 10;
-
-                // 先创建一个隐藏样本元素，量出旋转后的包围盒尺寸
-                const probe = document.createElement('span');
-                probe.className = 'wm-item';
-                probe.textContent = text;
-                probe.style.fontSize = fontSize + 'px';
-                probe.style.opacity = opacity.toString();
-                probe.style.transform = `rotate(-${angle}deg)`;
-                probe.style.visibility = 'hidden';
-                probe.style.left = '-9999px';
-                probe.style.top = '-9999px';
-                overlay.appendChild(probe);
-                const rect = probe.getBoundingClientRect();
-                const stampW = rect.width;
-                const stampH = rect.height;
-                overlay.removeChild(probe);
-
-                // 计算网格：仅在容器内布点，保证任何抖动后也不会越界
-                const padX = Math.ceil(stampW * 0.5);
-                const padY = Math.ceil(stampH * 0.5);
-                const cols = Math.max(1, Math.floor((W - 2*padX) / tile) + 1);
-                const rows = Math.max(1, Math.floor((H - 2*padY) / tile) + 1);
-
-                // —— 水平居中 ——
-                const centerX = W / 2;
-                const gridSpanX = (cols - 1) * tile;
-                const firstCX = centerX - gridSpanX / 2;
-
-                const centerVertical = false;
-                const baseCY0 = centerVertical ? (H/2 - ((rows - 1) * tile) / 2) : (padY + stampH/2);
-
-                for (let r = 0; r < rows; r++) {
-                  for (let c = 0; c < cols; c++) {
-                    const span = document.createElement('span');
-                    span.className = 'wm-item';
-                    span.textContent = text;
-                    span.style.fontSize = fontSize + 'px';
-                    span.style.opacity  = opacity.toString();
-                    span.style.transform = `rotate(-${angle}deg)`;
-
-                    // 交错排布（可选，让视觉更满）
-                    const stagger = (r % 2) ? tile / 2 : 0;
-
-                    // 以“中心点”定位
-                    const cx = firstCX + c * tile + stagger;
-                    const cy = baseCY0 + r * tile;
-
-                    // 轻微抖动
-                    const jx = jitter ? (Math.random()*2-1)*jitter : 0;
-                    const jy = jitter ? (Math.random()*2-1)*jitter : 0;
-
-                    // 转成左上角坐标并限界
-                    let x = Math.round(cx + jx - stampW / 2);
-                    let y = Math.round(cy + jy - stampH / 2);
-                    x = Math.max(0, Math.min(W - stampW, x));
-                    y = Math.max(0, Math.min(H - stampH, y));
-
-                    span.style.left = x + 'px';
-                    span.style.top  = y + 'px';
-                    overlay.appendChild(span);
-                  }
-                }
-            }
-        };
-    </script>
 </body>
 </html>'''
-        return Template(template_str)
+
+# 所有插入点都已在 Python 侧显式处理（Markup 或已转义），关闭自动转义
+_TEMPLATE_ENV = Environment(
+    autoescape=False,
+    auto_reload=False,
+    cache_size=400,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    undefined=StrictUndefined,
+)
+
+
+_PAGE_BODY_TEMPLATE = _TEMPLATE_ENV.from_string(PAGE_BODY_TEMPLATE)
+
+# 卡片片段模板：标签行与二维码为各视图共用的子片段
+_CARD_TAG_ROW = (
+    '{% if tag or tag_icon %}<div class="card-tag-row">'
+    '{% if tag_icon %}<img class="card-tag-icon" src="{{ tag_icon }}" alt="">{% endif %}'
+    '{% if tag %}<span class="card-tag">{{ tag }}</span>{% endif %}'
+    '</div>{% endif %}'
+)
+_CARD_QR = '{% if qr_src %}<img class="qr-code" src="{{ qr_src }}" alt="QR">{% endif %}'
+
+CARD_TEMPLATES = {
+    'contact': (
+        '<a class="card card-contact" href="{{ href }}" target="_blank" rel="noopener noreferrer">'
+        '<div class="card-media"><img src="{{ avatar }}" alt="avatar"></div>'
+        '<div class="card-body"><div class="card-title">{{ title }}</div>'
+        '{% if desc %}<div class="card-desc">{{ desc }}</div>{% endif %}'
+        + _CARD_TAG_ROW + '</div>' + _CARD_QR + '</a>'
+    ),
+    'miniapp': (
+        '<a class="card card-vertical card-miniapp" href="{{ href }}" target="_blank" rel="noopener noreferrer">'
+        '<div class="card-header"><div class="card-header-left">'
+        '{% if source or source_logo %}<div class="brand-inline">'
+        '{% if source_logo %}<img class="brand-icon" src="{{ source_logo }}" alt="">{% endif %}'
+        '{% if source %}<span class="brand-text">{{ source }}</span>{% endif %}'
+        '</div>{% endif %}'
+        '<div class="card-title">{{ title }}</div></div>' + _CARD_QR + '</div>'
+        '{% if preview %}<div class="card-preview"><img src="{{ preview }}" alt="preview"></div>{% endif %}'
+        + _CARD_TAG_ROW + '</a>'
+    ),
+    'news': (
+        '<a class="card card-news" href="{{ href }}" target="_blank" rel="noopener noreferrer">'
+        '<div class="card-header">'
+        '{% if preview %}<img class="thumb" src="{{ preview }}" alt="thumb">{% endif %}'
+        '<div class="card-header-right"><div class="card-title">{{ title }}</div></div>'
+        + _CARD_QR + '</div>'
+        '<div class="card-bottom"><div class="card-bottom-left">'
+        '{% if desc %}<div class="card-desc">{{ desc }}</div>{% endif %}'
+        + _CARD_TAG_ROW + '</div></div></a>'
+    ),
+    'generic': (
+        '<div class="card card-vertical">'
+        '{% if preview %}<div class="card-preview"><img src="{{ preview }}" alt="preview"></div>{% endif %}'
+        '<div class="card-body"><div class="card-title">{{ title }}</div>'
+        '{% if desc %}<div class="card-desc">{{ desc }}</div>{% endif %}'
+        '{% if qr_src %}<div class="qr-wrap"><img class="qr-code" src="{{ qr_src }}" alt="QR"></div>{% endif %}'
+        '</div></div>'
+    ),
+}
+
+# 卡片字段均为外部数据，由模板自动转义（含属性值）
+_CARD_TEMPLATE_ENV = Environment(autoescape=True, auto_reload=False)
+_CARD_TEMPLATES: Dict[str, Template] = {
+    view: _CARD_TEMPLATE_ENV.from_string(source) for view, source in CARD_TEMPLATES.items()
+}
+
+
+@functools.lru_cache(maxsize=IMAGE_DATA_URI_CACHE_SIZE)
+def _encode_image_file(path: str, mtime_ns: int, size: int) -> str:
+    """读取图片并编码为 data URI；mtime_ns/size 仅参与缓存键"""
+    mime = _guess_image_mime(path)
+    with open(path, 'rb') as f:
+        b64 = b64encode(f.read()).decode('ascii')
+    return f'data:{mime};base64,{b64}'
+
+
+@functools.lru_cache(maxsize=256)
+def _make_qr_data_uri(url: str, cache_dir: Optional[str] = None) -> str:
+    """生成二维码 data URI；提供 cache_dir 时结果按 URL 哈希持久化到磁盘，跨进程重启复用"""
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.txt')
+        try:
+            with open(path, 'r', encoding='ascii') as f:
+                cached = f.read()
+            if cached.startswith('data:image/'):
+                return cached
+        except (OSError, UnicodeDecodeError):
+            pass
+    try:
+        # 二维码仅用于屏幕展示，使用 L 级纠错即可得到更小的矩阵；segno 直接由矩阵写出 PNG，无需经过 PIL
+        data_uri = segno.make(url, error='l', micro=False).png_data_uri(scale=3, border=0)
+    except Exception:
+        return ''
+    if path:
+        # 先写临时文件再原子替换，避免并发渲染读到半截内容
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='ascii') as f:
+                f.write(data_uri)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+    return data_uri
+
+
+@functools.lru_cache(maxsize=8)
+def _get_static_prefix(font_family: str) -> str:
+    """预渲染页面静态头部（仅依赖字体等渲染设置）"""
+    return _TEMPLATE_ENV.from_string(PAGE_HEAD_TEMPLATE).render(font_family=font_family)
+
+
+@functools.lru_cache(maxsize=512)
+def _resolve_face_src(face_id: str, face_dirs: Tuple[str, ...], inline: bool, remote_static: bool) -> str:
+    """解析表情图片的 src：内联 data URI、@ 静态资源引用或本地 file:// 地址"""
+    if inline:
+        return _load_face_data_uri(face_id, face_dirs)
+
+    path = _find_face_file(face_id, face_dirs)
+    if not path:
+        return TRANSPARENT_PNG_DATA_URI
+    # 远程静态资源：使用 @ 前缀，由 _resolve_static_urls 替换为 static_base_url
+    rel = os.path.relpath(path, 'static')
+    if remote_static and not rel.startswith('..'):
+        return '@/' + rel.replace(os.sep, '/')
+    # 本地渲染：直接引用文件，由浏览器原生加载
+    return Path(os.path.abspath(path)).as_uri()
+
+
+def _link_href(m: 're.Match[str]') -> str:
+    """由 LINK_RE 的匹配结果生成链接地址：邮箱补 mailto:，www. 开头的链接补全协议"""
+    url = m.group()
+    if m.lastgroup == 'mail':
+        return 'mailto:' + url
+    return url if '://' in url else 'http://' + url
+
+
+@functools.lru_cache(maxsize=256)
+def _format_size(num_bytes: float) -> str:
+    """格式化文件大小，输出与 humanfriendly.format_size(binary=False) 一致（如 123.46 KB）"""
+    if num_bytes < 1000:
+        text = ('%.2f' % num_bytes).rstrip('0').rstrip('.')
+        return f"{text} {'byte' if num_bytes == 1 else 'bytes'}"
+    value = float(num_bytes)
+    for unit in SIZE_UNITS:
+        value /= 1000
+        if value < 1000:
+            break
+    return f"{('%.2f' % value).rstrip('0').rstrip('.')} {unit}"
+
+
+@functools.lru_cache(maxsize=64)
+def _build_watermark_css(text: str, font_family: str) -> str:
+    """生成水印背景：以水印文本为种子抖动布点的 SVG 平铺图块（data URI）
+
+    水印作为 .wm-overlay 的重复背景铺满容器，覆盖范围随实际排版高度变化，不依赖页面高度估算。
+    """
+    # 估算旋转后的包围盒尺寸：全角字符按 1em、其余按 0.55em 计宽，行高为 1
+    text_w = sum(
+        WATERMARK_FONT_PX if unicodedata.east_asian_width(ch) in ('W', 'F')
+        else WATERMARK_FONT_PX * WATERMARK_NARROW_CHAR_EM
+        for ch in text
+    )
+    rad = math.radians(WATERMARK_ANGLE)
+    cos_a, sin_a = math.cos(rad), math.sin(rad)
+    stamp_w = text_w * cos_a + WATERMARK_FONT_PX * sin_a
+    stamp_h = text_w * sin_a + WATERMARK_FONT_PX * cos_a
+
+    # 图块宽为容器宽、高为两行网格，行间交错；纵向重复即可覆盖任意高度
+    width = CONTAINER_WIDTH_PX
+    tile = WATERMARK_TILE_PX
+    height = 2 * tile
+    pad_x = math.ceil(stamp_w * 0.5)
+    cols = max(1, (width - 2 * pad_x) // tile + 1)
+    first_cx = width / 2 - (cols - 1) * tile / 2
+    first_cy = tile / 2
+
+    rng = random.Random(text)
+    jitter = WATERMARK_JITTER_PX
+    label = _stdhtml.escape(text)
+    stamps = []
+    for r in range(2):
+        stagger = tile / 2 if r % 2 else 0
+        for c in range(cols):
+            cx = first_cx + c * tile + stagger + rng.uniform(-jitter, jitter)
+            cy = first_cy + r * tile + rng.uniform(-jitter, jitter)
+            # 限界在图块内，避免相邻图块接缝处截断
+            cx = max(stamp_w / 2, min(width - stamp_w / 2, cx))
+            cy = max(stamp_h / 2, min(height - stamp_h / 2, cy))
+            stamps.append(
+                f'<text x="{cx:.0f}" y="{cy:.0f}" transform="rotate(-{WATERMARK_ANGLE} {cx:.0f} {cy:.0f})">'
+                f'{label}</text>'
+            )
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">'
+        f'<g font-family="{_stdhtml.escape(font_family)}" font-size="{WATERMARK_FONT_PX}" font-weight="500" '
+        f'fill="#000" fill-opacity="{WATERMARK_OPACITY}" text-anchor="middle" dominant-baseline="central">'
+        f'{"".join(stamps)}</g></svg>'
+    )
+    return f"background-image:url('data:image/svg+xml;charset=utf-8,{quote(svg)}')"
+
+
+# 渲染时间只展示到分钟，同一分钟内复用格式化结果：(分钟序号, 文本)
+_render_time_cache: Tuple[int, str] = (-1, '')
+
+
+def _current_render_time() -> str:
+    """返回当前时间字符串（分钟精度）"""
+    global _render_time_cache
+    minute = int(time.time() // 60)
+    if _render_time_cache[0] != minute:
+        _render_time_cache = (minute, datetime.now().strftime("%Y-%m-%d %H:%M"))
+    return _render_time_cache[1]
+
+
+class _RenderContext:
+    """单次渲染的可变状态：收集到的链接（按出现顺序去重）与预解析的图片地址"""
+
+    __slots__ = ('links', '_seen', 'image_srcs')
+
+    def __init__(self, image_srcs: Optional[Dict[str, str]] = None):
+        self.links: List[str] = []
+        self._seen: set = set()
+        self.image_srcs: Dict[str, str] = image_srcs or {}
+
+    def add_links(self, links: List[str]) -> None:
+        for u in links:
+            if u and u not in self._seen:
+                self._seen.add(u)
+                self.links.append(u)
+
+
+class HTMLRenderer(ProcessorPlugin):
+    """HTML渲染器，将消息渲染为HTML页面"""
+    
+    def __init__(self):
+        super().__init__("html_renderer", {})
+        self.settings = get_settings()
+        self.template = self.load_template()
+        self._static_prefix = _get_static_prefix(self.settings.rendering.font_family)
+        # 表情资源目录在构造时扫描一次（仅保留实际存在的目录）
+        self._face_dirs: Tuple[str, ...] = self._find_face_dirs()
+        # 本地静态模式下预编码的静态资源（initialize 时构建）
+        self._asset_cache: Dict[str, str] = {}
+        # 二维码磁盘缓存目录（initialize 时创建，不可用时仅使用内存缓存）
+        self._qr_cache_dir: Optional[str] = None
+        
+    async def initialize(self):
+        """初始化渲染器"""
+        self._asset_cache = self._load_static_assets()
+        self._qr_cache_dir = self._init_qr_cache_dir()
+        self.logger.info("HTML渲染器初始化完成")
+        
+    async def shutdown(self):
+        """关闭渲染器"""
+        pass
         
-    async def render_html(self, data: Dict[str, Any]) -> str:
-        """渲染HTML页面"""
-        # 每次渲染前重置链接收集器
-        self._collected_links: List[str] = []
+    async def process(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """渲染HTML"""
+        html, links = await self.render_html(data)
+        data['rendered_html'] = html
+        # 暴露在渲染过程中收集到的链接，供后续流程（发布时附带）使用
+        data['extracted_links'] = links
+        return data
+        
+    def load_template(self) -> Template:
+        """加载HTML模板（页面动态部分，模块导入时已编译）"""
+        return _PAGE_BODY_TEMPLATE
+        
+    async def render_html(self, data: Dict[str, Any]) -> Tuple[str, List[str]]:
+        """渲染HTML页面（在线程池中执行），返回 (html, 收集到的链接)"""
+        # 先并发预处理本地图片与卡片二维码，再把纯 CPU 的渲染放到线程池执行
+        image_srcs = await self._prefetch_assets(data.get('messages', []))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._render_html_sync, data, image_srcs)
+
+    def _render_html_sync(
+        self,
+        data: Dict[str, Any],
+        image_srcs: Optional[Dict[str, str]] = None
+    ) -> Tuple[str, List[str]]:
+        """同步渲染HTML页面，返回 (html, 收集到的链接)
+
+        Args:
+            data: 待渲染数据
+            image_srcs: 预先解析好的图片地址映射（url -> src），未命中时在渲染中同步解析
+        """
+        # 渲染状态保存在本次调用的上下文中，同一实例可并发渲染
+        ctx = _RenderContext(image_srcs)
+        html = self._render_page(data, ctx)
+        return html, ctx.links
+
+    async def _prefetch_assets(self, messages: List[Dict[str, Any]]) -> Dict[str, str]:
+        """并发预处理消息树中的资源：解析本地图片 src、预生成卡片二维码（均在线程中执行）
+
+        二维码结果写入 _make_qr_data_uri 的 LRU/磁盘缓存，渲染时直接命中；返回本地图片的 url -> src 映射。
+        """
+        image_urls, card_urls = await asyncio.to_thread(self._collect_prefetch_targets, messages)
+        image_urls = [u for u in image_urls if not u.startswith(('http://', 'https://', 'data:image'))]
+        if not image_urls and not card_urls:
+            return {}
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._resolve_image_src, u) for u in image_urls),
+            *(asyncio.to_thread(self._qr_data_uri, u) for u in card_urls),
+        )
+        return dict(zip(image_urls, results))
+
+    def _collect_prefetch_targets(self, messages: List[Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+        """收集消息树中的图片 URL 与卡片跳转 URL"""
+        card_urls = self._collect_card_urls(self._iter_message_nodes(messages, 'json'))
+        return self._collect_image_urls(messages), card_urls
+
+    def _collect_card_urls(self, cards: Iterable[Dict[str, Any]]) -> List[str]:
+        """收集卡片消息的跳转 URL（按出现顺序去重）"""
+        card_urls = []
+        for card in cards:
+            card_data = self._parse_card_data((card.get('data') or {}).get('data', '{}'))
+            url = self._extract_card_url(card_data) if card_data else None
+            if url:
+                card_urls.append(url)
+        return list(dict.fromkeys(card_urls))
+
+    def _collect_image_urls(self, messages: List[Dict[str, Any]]) -> List[str]:
+        """按出现顺序返回消息树中去重后的图片 URL"""
+        urls = [
+            node['data']['url'] for node in self._iter_message_nodes(messages, 'image')
+            if node['data'].get('url')
+        ]
+        return list(dict.fromkeys(urls))
+
+    def _iter_message_nodes(self, messages: List[Dict[str, Any]], msg_type: str) -> Iterator[Dict[str, Any]]:
+        """遍历消息树（含合并转发与嵌套消息），按出现顺序产出指定类型且带 data 的消息段"""
+        stack: List[Any] = [messages]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(reversed(node))
+                continue
+            if not isinstance(node, dict):
+                continue
+            data = node.get('data')
+            if isinstance(data, dict):
+                if node.get('type') == msg_type:
+                    yield node
+                elif node.get('type') == 'forward':
+                    stack.append(data.get('messages') or data.get('content') or [])
+            for key in ('message', 'content'):
+                if isinstance(node.get(key), list):
+                    stack.append(node[key])
+
+    def _render_page(self, data: Dict[str, Any], ctx: _RenderContext) -> str:
         # 获取基本信息
         sender_id = data.get('sender_id', '10000')
         nickname = data.get('nickname', '匿名用户')
@@ -583,20 +997,28 @@ class HTMLRenderer(ProcessorPlugin):
             avatar_url = f"https://qlogo2.store.qq.com/qzone/{sender_id}/{sender_id}/640"
         
         # 渲染消息内容
-        content_html = self.render_messages(data.get('messages', []))
+        content_html = self.render_messages(data.get('messages', []), ctx)
         
-        # 渲染HTML
-        html = self.template.render(
-            avatar_url=avatar_url,
-            nickname=nickname,
-            user_id_display=user_id_display,
-            content_html=content_html,
-            watermark_text=watermark_text,
+        # 水印为平铺背景，随容器实际高度铺满，无需浏览器执行脚本
+        page_size = self._estimate_page_size(data.get('messages', []))
+        watermark_style = ''
+        if watermark_text and str(watermark_text).strip():
+            watermark_style = _build_watermark_css(
+                str(watermark_text), self.settings.rendering.font_family
+            )
+
+        # 渲染HTML：预渲染的静态样式头部 + 动态正文（流式分块产出后一次性拼接）
+        html = self._static_prefix + ''.join(self.template.stream(
+            page_size=page_size,
+            avatar_url=Markup(self._html(avatar_url)),
+            nickname=Markup(self._html(nickname)),
+            user_id_display=Markup(self._html(user_id_display)),
+            content_html=Markup(content_html),
+            watermark_style=Markup(watermark_style),
             show_avatar=show_avatar,
-            render_time=datetime.now().strftime("%Y-%m-%d %H:%M"),
-            wall_mark=data.get('wall_mark') or 'Graffito',
-            font_family=self.settings.rendering.font_family
-        )
+            render_time=_current_render_time(),
+            wall_mark=Markup(self._html(data.get('wall_mark') or 'Graffito'))
+        ))
         
         # 替换静态资源路径: @ -> static_base_url
         static_base_url = self.settings.rendering.static_base_url
@@ -604,65 +1026,118 @@ class HTMLRenderer(ProcessorPlugin):
         
         return html
         
-    def render_messages(self, messages: List[Dict[str, Any]]) -> str:
-        """渲染消息列表为HTML"""
-        html_parts = []
-        
+    def _estimate_page_size(self, messages: List[Dict[str, Any]]) -> float:
+        """按消息数量与类型估算页面高度（英寸），限制在 4in~24in 并向上取整到 0.1in"""
+        height_px = PAGE_CHROME_PX + self._estimate_messages_height(messages)
+        inches = min(max(height_px / PX_PER_INCH, PAGE_MIN_INCH), PAGE_MAX_INCH)
+        return math.ceil(inches * 10) / 10
+
+    def _estimate_messages_height(self, messages: List[Dict[str, Any]]) -> int:
+        """粗略估算消息列表渲染后的像素高度"""
+        height = 0
         for msg in messages:
+            if not isinstance(msg, dict):
+                continue
             msg_type = msg.get('type')
-            
+            data = msg.get('data') or {}
             if msg_type == 'text':
-                html_parts.append(self.render_text(msg))
-            elif msg_type == 'image':
-                html_parts.append(self.render_image(msg))
-            elif msg_type == 'video':
-                html_parts.append(self.render_video(msg))
+                text = str(data.get('text', ''))
+                lines = sum(
+                    max(1, math.ceil(len(line) / BUBBLE_LINE_CHARS))
+                    for line in text.split('\n')
+                )
+                height += lines * BUBBLE_LINE_PX
+            elif msg_type in ('image', 'video'):
+                height += IMAGE_BLOCK_PX
             elif msg_type == 'file':
-                html_parts.append(self.render_file(msg))
+                height += FILE_BLOCK_PX
+            elif msg_type == 'json':
+                height += CARD_BLOCK_PX
+            elif msg_type == 'reply':
+                height += REPLY_BLOCK_PX
             elif msg_type == 'face':
-                html_parts.append(self.render_face(msg))
+                raw = data.get('raw') or {}
+                is_sticker = isinstance(raw, dict) and _is_sticker_face_type(raw.get('faceType'))
+                height += STICKER_BLOCK_PX if is_sticker else BUBBLE_LINE_PX
             elif msg_type == 'poke':
-                html_parts.append(self.render_poke(msg))
+                height += BUBBLE_LINE_PX
             elif msg_type == 'forward':
-                html_parts.append(self.render_forward(msg))
-            elif msg_type == 'reply':
-                html_parts.append(self.render_reply(msg))
-            elif msg_type == 'json':
-                html_parts.append(self.render_card(msg))
-            elif msg.get('message'):
-                # 嵌套消息
-                for sub_msg in msg.get('message', []):
-                    html_parts.append(self.render_messages([sub_msg]))
-                    
-        return '\n'.join(html_parts)
+                height += FORWARD_TITLE_PX
+                raw = data.get('messages') or data.get('content') or []
+                if isinstance(raw, list):
+                    for item in raw:
+                        if not isinstance(item, dict):
+                            continue
+                        if 'type' in item:
+                            height += self._estimate_messages_height([item])
+                        else:
+                            height += self._estimate_messages_height(
+                                item.get('message') or item.get('content') or []
+                            )
+            elif isinstance(msg.get('message'), list):
+                height += self._estimate_messages_height(msg.get('message'))
+        return height
+
+    def render_messages(
+        self,
+        messages: List[Dict[str, Any]],
+        ctx: Optional[_RenderContext] = None
+    ) -> str:
+        """渲染消息列表为HTML"""
+        buf = StringIO()
+        self._render_messages_into(messages, buf, ctx or _RenderContext())
+        return buf.getvalue()
+
+    def _render_messages_into(
+        self,
+        messages: List[Dict[str, Any]],
+        out: StringIO,
+        ctx: _RenderContext
+    ) -> None:
+        """将消息列表的 HTML 依次写入同一个缓冲区，嵌套消息不再逐层拼接中间字符串"""
+        renderers = self._RENDERERS
+        # 嵌套消息（msg.message）原地展开：压入其迭代器继续分派，不再递归调用
+        stack = [iter(messages)]
+        while stack:
+            for msg in stack[-1]:
+                msg_type = msg.get('type')
+                handler = renderers.get(msg_type)
+                if handler is not None:
+                    out.write(handler(self, msg, ctx))
+                    out.write('\n')
+                elif msg_type == 'forward':
+                    self._render_forward_into(msg, out, ctx)
+                    out.write('\n')
+                elif msg.get('message'):
+                    stack.append(iter(msg['message']))
+                    break
+            else:
+                stack.pop()
         
-    def render_text(self, msg: Dict[str, Any]) -> str:
+    def render_text(self, msg: Dict[str, Any], ctx: '_RenderContext') -> str:
         """渲染文本消息"""
         text = msg.get('data', {}).get('text', '')
         # 识别文本中的链接并转为可点击锚点
         linkified, links = self._linkify_and_collect(text)
-        self._collect_links(links)
-        return f'<div class="bubble">{linkified}</div>'
+        ctx.add_links(links)
+        return BUBBLE_FMT.format_map({'text': linkified})
         
-    def render_image(self, msg: Dict[str, Any]) -> str:
+    def render_image(self, msg: Dict[str, Any], ctx: '_RenderContext') -> str:
         """渲染图片消息"""
         data = msg.get('data', {})
         url = data.get('url', '')
-        # 将本地路径/file:// 转为 data:URI 以便在无权限的浏览器上下文中可渲染
-        src = self._resolve_image_src(url)
+        # 将本地路径/file:// 转为 data:URI 以便在无权限的浏览器上下文中可渲染（优先使用预解析结果）
+        src = ctx.image_srcs.get(url) or self._resolve_image_src(url)
         # 不再收集或展示图片的“原始链接”等，避免将图片渲染成链接
-        return f'<img src="{src}" alt="Image">'
+        return IMAGE_FMT.format_map({'src': self._attr(src)})
         
-    def render_video(self, msg: Dict[str, Any]) -> str:
+    def render_video(self, msg: Dict[str, Any], ctx: '_RenderContext') -> str:
         """渲染视频消息"""
         data = msg.get('data', {})
         url = data.get('url') or data.get('file') or ''
-        return f'''<video controls autoplay muted>
-            <source src="{url}" type="video/mp4">
-            Your browser does not support the video tag.
-        </video>'''
+        return VIDEO_FMT.format_map({'src': self._attr(url)})
         
-    def render_file(self, msg: Dict[str, Any]) -> str:
+    def render_file(self, msg: Dict[str, Any], ctx: '_RenderContext') -> str:
         """渲染文件消息"""
         data = msg.get('data', {})
         file_name = data.get('file', '未命名文件')
@@ -672,50 +1147,48 @@ class HTMLRenderer(ProcessorPlugin):
         ext = Path(file_name).suffix.lower()
         icon = self.get_file_icon(ext)
         
-        # 格式化文件大小（humanfriendly）
+        # 格式化文件大小
         try:
-            size_str = format_size(int(file_size), binary=False)
-        except Exception:
-            size_str = format_size(float(file_size), binary=False)
-            
-        href = self._file_href(file_name)
-        return f'''<div class="file-block">
-            <img class="file-icon" src="{icon}" alt="File Icon">
-            <div class="file-info">
-                <a class="file-name" href="{href}" download>{self._html(file_name)}</a>
-                <div class="file-meta">{size_str}</div>
-            </div>
-        </div>'''
+            size = int(file_size)
+        except (TypeError, ValueError):
+            size = float(file_size)
+        size_str = _format_size(size)
+
+        return FILE_BLOCK_FMT.format_map({
+            'icon': icon,
+            'href': self._file_href(file_name),
+            'name': self._html(file_name),
+            'size': size_str,
+        })
         
-    def render_face(self, msg: Dict[str, Any]) -> str:
+    def render_face(self, msg: Dict[str, Any], ctx: '_RenderContext') -> str:
         """渲染QQ表情"""
         data = msg.get('data', {})
         face_id = str(data.get('id', '0'))
-        face_text = ''
-        try:
-            raw = data.get('raw') or {}
-            face_text = raw.get('faceText') or ''
-            # 判断是否为“大表情/贴纸”：faceType >= 2 视为大表情
-            face_type_val = raw.get('faceType')
-            is_sticker = False
-            try:
-                if face_type_val is not None and int(face_type_val) >= 2:
-                    is_sticker = True
-            except Exception:
-                is_sticker = False
-        except Exception:
-            pass
+        raw = data.get('raw') or {}
+        if not isinstance(raw, dict):
+            raw = {}
+        face_text = raw.get('faceText') or ''
+        is_sticker = _is_sticker_face_type(raw.get('faceType'))
         src = self._get_face_src(face_id)
-        alt = face_text or '表情'
-        css_class = 'sticker' if locals().get('is_sticker') else 'cqface'
-        return f'<img class="{css_class}" src="{src}" alt="{alt}">'
+        return FACE_FMT.format_map({
+            'css_class': 'sticker' if is_sticker else 'cqface',
+            'src': src,
+            'alt': self._attr(face_text or '表情'),
+        })
         
-    def render_poke(self, msg: Dict[str, Any]) -> str:
+    def render_poke(self, msg: Dict[str, Any], ctx: '_RenderContext') -> str:
         """渲染戳一戳"""
-        return '<img class="poke-icon" src="@/source/poke.png" alt="戳一戳">'
+        return POKE_HTML
         
-    def render_forward(self, msg: Dict[str, Any]) -> str:
+    def render_forward(self, msg: Dict[str, Any], ctx: '_RenderContext') -> str:
         """渲染合并转发"""
+        buf = StringIO()
+        self._render_forward_into(msg, buf, ctx)
+        return buf.getvalue()
+
+    def _render_forward_into(self, msg: Dict[str, Any], out: StringIO, ctx: _RenderContext) -> None:
+        """将合并转发的 HTML 写入缓冲区"""
         data = msg.get('data', {})
         raw = data.get('messages') or data.get('content') or []
 
@@ -737,17 +1210,14 @@ class HTMLRenderer(ProcessorPlugin):
                     elif 'type' in item:
                         segment_lists.append([item])
 
-        blocks: List[str] = []
+        out.write(FORWARD_OPEN_HTML)
         for segs in segment_lists:
-            inner_html = self.render_messages(segs)
-            blocks.append(f'<div class="forward-item">{inner_html}</div>')
-
-        return f'''<div class="forward-title">合并转发聊天记录</div>
-        <div class="forward">
-            {''.join(blocks)}
-        </div>'''
+            out.write('<div class="forward-item">')
+            self._render_messages_into(segs, out, ctx)
+            out.write('</div>')
+        out.write('</div>')
         
-    def render_reply(self, msg: Dict[str, Any]) -> str:
+    def render_reply(self, msg: Dict[str, Any], ctx: '_RenderContext') -> str:
         """渲染回复消息"""
         data = msg.get('data', {})
         reply_id = data.get('id', '')
@@ -757,31 +1227,15 @@ class HTMLRenderer(ProcessorPlugin):
         # 链接化预览文本
         preview_html, _ = self._linkify_and_collect(str(preview_text))
         meta = f"回复消息{(' · ' + self._html(author)) if author else ''}"
-        return f'''<div class="reply" data-mid="{self._html(reply_id)}">
-            <div class="reply-meta">{meta}</div>
-            <div class="reply-body">{preview_html or '引用的消息'}</div>
-        </div>'''
+        return REPLY_FMT.format_map({
+            'mid': self._attr(reply_id),
+            'meta': meta,
+            'body': preview_html or '引用的消息',
+        })
         
-    def render_card(self, msg: Dict[str, Any]) -> str:
+    def render_card(self, msg: Dict[str, Any], ctx: '_RenderContext') -> str:
         """渲染卡片消息（支持 contact/miniapp/news/generic），并在有跳转时渲染二维码"""
-        raw = msg.get('data', {}).get('data', '{}')
-        card_data: Optional[Dict[str, Any]] = None
-        try:
-            if isinstance(raw, dict):
-                card_data = raw
-            else:
-                s = str(raw)
-                # 兼容 HTML 实体/转义
-                s = s.replace('&#44;', ',').replace('\\/', '/')
-                try:
-                    import html as _html
-                    s = _html.unescape(s)
-                except Exception:
-                    pass
-                card_data = json.loads(s)
-        except Exception:
-            card_data = None
-
+        card_data = self._parse_card_data(msg.get('data', {}).get('data', '{}'))
         if not isinstance(card_data, dict):
             return '<div class="card">卡片消息</div>'
 
@@ -790,7 +1244,7 @@ class HTMLRenderer(ProcessorPlugin):
 
         url = self._extract_card_url(card_data)
         if url:
-            self._collect_links([url])
+            ctx.add_links([url])
             qr_src = self._qr_data_uri(url)
         else:
             qr_src = None
@@ -798,222 +1252,166 @@ class HTMLRenderer(ProcessorPlugin):
         # contact
         if view == 'contact' and isinstance(meta.get('contact'), dict):
             c = meta.get('contact') or {}
-            avatar = c.get('avatar') or ''
-            nickname = c.get('nickname') or '联系人'
-            contact_text = c.get('contact') or ''
-            tag = c.get('tag')
-            tag_icon = c.get('tagIcon')
-            href = url or '#'
-            parts = []
-            parts.append(f'<a class="card card-contact" href="{href}" target="_blank" rel="noopener noreferrer">')
-            parts.append('<div class="card-media">')
-            parts.append(f'<img src="{avatar}" alt="avatar">')
-            parts.append('</div>')
-            parts.append('<div class="card-body">')
-            parts.append(f'<div class="card-title">{self._html(nickname)}</div>')
-            if contact_text:
-                parts.append(f'<div class="card-desc">{self._html(contact_text)}</div>')
-            if tag or tag_icon:
-                parts.append('<div class="card-tag-row">')
-                if tag_icon:
-                    parts.append(f'<img class="card-tag-icon" src="{tag_icon}" alt="">')
-                if tag:
-                    parts.append(f'<span class="card-tag">{self._html(tag)}</span>')
-                parts.append('</div>')
-            parts.append('</div>')
-            if qr_src:
-                parts.append(f'<img class="qr-code" src="{qr_src}" alt="QR">')
-            parts.append('</a>')
-            return ''.join(parts)
+            return _CARD_TEMPLATES['contact'].render(
+                href=url or '#',
+                avatar=c.get('avatar') or '',
+                title=c.get('nickname') or '联系人',
+                desc=c.get('contact') or '',
+                tag=c.get('tag'),
+                tag_icon=c.get('tagIcon'),
+                qr_src=qr_src,
+            )
 
         # miniapp
         if view == 'miniapp' and isinstance(meta.get('miniapp'), dict):
             m = meta.get('miniapp') or {}
-            href = (m.get('jumpUrl') or m.get('doc_url') or url or '#')
-            parts = []
-            parts.append(f'<a class="card card-vertical card-miniapp" href="{href}" target="_blank" rel="noopener noreferrer">')
-            parts.append('<div class="card-header">')
-            parts.append('<div class="card-header-left">')
-            if m.get('source') or m.get('sourcelogo'):
-                parts.append('<div class="brand-inline">')
-                if m.get('sourcelogo'):
-                    parts.append(f'<img class="brand-icon" src="{m.get("sourcelogo")}" alt="">')
-                if m.get('source'):
-                    parts.append(f'<span class="brand-text">{self._html(m.get("source"))}</span>')
-                parts.append('</div>')
-            title = m.get('title') or '小程序卡片'
-            parts.append(f'<div class="card-title">{self._html(title)}</div>')
-            parts.append('</div>')
-            if qr_src:
-                parts.append(f'<img class="qr-code" src="{qr_src}" alt="QR">')
-            parts.append('</div>')
-            if m.get('preview'):
-                parts.append('<div class="card-preview">')
-                parts.append(f'<img src="{m.get("preview")}" alt="preview">')
-                parts.append('</div>')
-            if m.get('tag') or m.get('tagIcon'):
-                parts.append('<div class="card-tag-row">')
-                if m.get('tagIcon'):
-                    parts.append(f'<img class="card-tag-icon" src="{m.get("tagIcon")}" alt="">')
-                if m.get('tag'):
-                    parts.append(f'<span class="card-tag">{self._html(m.get("tag"))}</span>')
-                parts.append('</div>')
-            parts.append('</a>')
-            return ''.join(parts)
+            return _CARD_TEMPLATES['miniapp'].render(
+                href=m.get('jumpUrl') or m.get('doc_url') or url or '#',
+                source=m.get('source'),
+                source_logo=m.get('sourcelogo'),
+                title=m.get('title') or '小程序卡片',
+                preview=m.get('preview'),
+                tag=m.get('tag'),
+                tag_icon=m.get('tagIcon'),
+                qr_src=qr_src,
+            )
 
         # news
         if view == 'news' and isinstance(meta.get('news'), dict):
             n = meta.get('news') or {}
-            href = (n.get('jumpUrl') or url or '#')
-            parts = []
-            parts.append(f'<a class="card card-news" href="{href}" target="_blank" rel="noopener noreferrer">')
-            parts.append('<div class="card-header">')
-            if n.get('preview'):
-                parts.append(f'<img class="thumb" src="{n.get("preview")}" alt="thumb">')
-            parts.append('<div class="card-header-right">')
-            title = n.get('title') or '分享'
-            parts.append(f'<div class="card-title">{self._html(title)}</div>')
-            parts.append('</div>')
-            if qr_src:
-                parts.append(f'<img class="qr-code" src="{qr_src}" alt="QR">')
-            parts.append('</div>')
-            # bottom
-            parts.append('<div class="card-bottom">')
-            parts.append('<div class="card-bottom-left">')
-            if n.get('desc'):
-                parts.append(f'<div class="card-desc">{self._html(n.get("desc"))}</div>')
-            if n.get('tag') or n.get('tagIcon'):
-                parts.append('<div class="card-tag-row">')
-                if n.get('tagIcon'):
-                    parts.append(f'<img class="card-tag-icon" src="{n.get("tagIcon")}" alt="">')
-                if n.get('tag'):
-                    parts.append(f'<span class="card-tag">{self._html(n.get("tag"))}</span>')
-                parts.append('</div>')
-            parts.append('</div>')
-            parts.append('</div>')
-            parts.append('</a>')
-            return ''.join(parts)
+            return _CARD_TEMPLATES['news'].render(
+                href=n.get('jumpUrl') or url or '#',
+                preview=n.get('preview'),
+                title=n.get('title') or '分享',
+                desc=n.get('desc'),
+                tag=n.get('tag'),
+                tag_icon=n.get('tagIcon'),
+                qr_src=qr_src,
+            )
 
         # generic
         g = self._first_entry_value(meta)
-        title = g.get('title') or card_data.get('prompt') or (card_data.get('view') or '卡片')
-        desc = g.get('desc') or ''
-        preview = g.get('preview')
-        parts = []
-        parts.append('<div class="card card-vertical">')
-        if preview:
-            parts.append('<div class="card-preview">')
-            parts.append(f'<img src="{preview}" alt="preview">')
-            parts.append('</div>')
-        parts.append('<div class="card-body">')
-        parts.append(f'<div class="card-title">{self._html(title)}</div>')
-        if desc:
-            parts.append(f'<div class="card-desc">{self._html(desc)}</div>')
-        if qr_src:
-            parts.append('<div class="qr-wrap">')
-            parts.append(f'<img class="qr-code" src="{qr_src}" alt="QR">')
-            parts.append('</div>')
-        parts.append('</div>')
-        parts.append('</div>')
-        return ''.join(parts)
-            
-    def get_file_icon(self, ext: str) -> str:
+        return _CARD_TEMPLATES['generic'].render(
+            preview=g.get('preview'),
+            title=g.get('title') or card_data.get('prompt') or (card_data.get('view') or '卡片'),
+            desc=g.get('desc') or '',
+            qr_src=qr_src,
+        )
+
+    def render_cards(
+        self,
+        cards: List[Dict[str, Any]],
+        ctx: Optional[_RenderContext] = None
+    ) -> List[str]:
+        """批量渲染卡片：先在线程池中并发生成全部二维码，再逐个渲染（二维码均命中缓存）"""
+        ctx = ctx or _RenderContext()
+        urls = self._collect_card_urls(cards)
+        if len(urls) > 1:
+            with ThreadPoolExecutor(max_workers=min(QR_BATCH_WORKERS, len(urls))) as executor:
+                list(executor.map(self._qr_data_uri, urls))
+        return [self.render_card(card, ctx) for card in cards]
+
+    def _parse_card_data(self, raw: Any) -> Optional[Dict[str, Any]]:
+        """解析卡片消息的 JSON 载荷，兼容 HTML 实体转义；无法解析时返回 None"""
+        if isinstance(raw, dict):
+            return raw
+        card_data = None
+        s = raw.decode('utf-8', 'replace') if isinstance(raw, (bytes, bytearray)) else str(raw)
+        s = s.lstrip()
+        if s.startswith('{') and '&' not in s:
+            # 快速路径：以 { 开头且不含 HTML 实体的载荷直接解析（JSON 本身支持 \/ 转义）
+            try:
+                card_data = json.loads(s)
+            except json.JSONDecodeError:
+                card_data = None
+        if card_data is None:
+            # 兼容 HTML 实体/转义
+            s = s.replace('&#44;', ',').replace('\\/', '/')
+            s = _stdhtml.unescape(s)
+            try:
+                card_data = json.loads(s)
+            except json.JSONDecodeError:
+                card_data = None
+        return card_data if isinstance(card_data, dict) else None
+
+    # 消息类型 -> 渲染方法（返回 HTML 片段）；forward 直接写入缓冲区，单独处理
+    _RENDERERS = {
+        'text': render_text,
+        'image': render_image,
+        'video': render_video,
+        'file': render_file,
+        'face': render_face,
+        'poke': render_poke,
+        'reply': render_reply,
+        'json': render_card,
+    }
+
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def get_file_icon(ext: str) -> str:
         """根据文件扩展名获取图标"""
-        icon_map = {
-            '.doc': 'doc.png',
-            '.docx': 'doc.png',
-            '.pdf': 'pdf.png',
-            '.xls': 'xls.png',
-            '.xlsx': 'xls.png',
-            '.ppt': 'ppt.png',
-            '.pptx': 'ppt.png',
-            '.zip': 'zip.png',
-            '.rar': 'rar.png',
-            '.txt': 'txt.png',
-            '.mp3': 'audio.png',
-            '.mp4': 'video.png',
-            '.jpg': 'image.png',
-            '.png': 'image.png',
-            '.gif': 'image.png',
-        }
-        
-        icon = icon_map.get(ext, 'unknown.png')
+        icon = FILE_ICON_MAP.get(ext, 'unknown.png')
         return f"@/file/{icon}"
 
     # ===== 工具方法 =====
-    def _html(self, text: Any) -> str:
-        try:
-            import html as _html
-            return _html.escape(str(text))
-        except Exception:
-            return str(text)
-
-    def _anchor(self, url: str) -> str:
-        return f'<a href="{url}" target="_blank" rel="noopener noreferrer">{url}</a>'
-
-    def _linkify_and_collect(self, text: str) -> (str, List[str]):
-        """将文本中的URL替换为可点击链接，并返回收集到的URL列表（linkify-it-py）"""
+    def _html(self, text: Any, _table: Dict[int, str] = HTML_ESCAPE_TABLE) -> str:
+        """HTML 转义（转义表以默认参数绑定）；空串与不含特殊字符的文本原样返回，不分配新字符串"""
+        if text.__class__ is not str:
+            text = str(text)
+        if not text or not HTML_SPECIAL_SEARCH(text):
+            return text
+        return text.translate(_table)
+
+    def _attr(self, value: Any) -> str:
+        """属性值转义；不含特殊字符时原样返回（图片 data URI 可达数 MB，避免无谓的逐字符 translate）"""
+        if value.__class__ is not str:
+            value = str(value)
+        if '"' in value or '&' in value or '<' in value or '>' in value or "'" in value:
+            return value.translate(HTML_ESCAPE_TABLE)
+        return value
+
+    def _anchor(self, url: str, text: Optional[str] = None) -> str:
+        href = self._attr(url)
+        # 文字与链接相同时（最常见）只转义一次
+        label = href if text is None or text == url else self._html(text)
+        return _format_anchor(href, label)
+
+    def _linkify_and_collect(self, text: str) -> Tuple[str, List[str]]:
+        """转义文本并将其中的 URL/邮箱替换为可点击链接，返回 (HTML, 收集到的链接列表)"""
         if not text:
             return '', []
-        # 先替换换行为 <br>
-        text_html = text.replace('\n', '<br>')
-
-        # 使用 LinkifyIt 解析链接
+        if '://' not in text and 'www.' not in text and '@' not in text:
+            # 快速路径：不可能含链接的文本整体一次 translate 完成转义与换行替换
+            return text.translate(HTML_TEXT_ESCAPE_TABLE), []
         collected: List[str] = []
-        parts: List[str] = []
-        last_idx = 0
-        matches = self._linkify.match(text)
-        for m in matches or []:
-            start = m.index
-            end = m.last_index
-            url = m.url if hasattr(m, 'url') else text[start:end]
-            # 添加前一段普通文本（替换其内部换行）
-            if start > last_idx:
-                chunk = text[last_idx:start]
-                parts.append(chunk.replace('\n', '<br>'))
-            # 追加链接锚点
-            if url:
-                collected.append(url)
-                parts.append(self._anchor(url))
-            else:
-                # 万一无 url 字段，直接原样输出
-                chunk = text[start:end]
-                parts.append(chunk.replace('\n', '<br>'))
-            last_idx = end
-        # 追加剩余文本
-        if last_idx < len(text):
-            parts.append(text[last_idx:].replace('\n', '<br>'))
-
-        return ''.join(parts) or text_html, collected
-
-    def _collect_links(self, links: List[str]):
-        if not links:
-            return
-        seen = set(self._collected_links)
-        for u in links:
-            if u and u not in seen:
-                self._collected_links.append(u)
-                seen.add(u)
+
+        def _replace(m: 're.Match[str]') -> str:
+            if m.lastgroup == 'esc':
+                return m.group().translate(HTML_TEXT_ESCAPE_TABLE)
+            href = _link_href(m)
+            collected.append(href)
+            return self._anchor(href, m.group())
+
+        return LINKIFY_RE.sub(_replace, text), collected
+
+    def _find_links(self, text: str) -> List[str]:
+        """仅提取文本中的链接（不生成 HTML）"""
+        return [_link_href(m) for m in LINK_RE.finditer(text)]
 
     def _extract_urls_from_object(self, obj: Any) -> List[str]:
-        """从任意嵌套对象中提取URL字符串"""
+        """从任意嵌套对象中提取URL字符串（显式栈迭代遍历，按出现顺序去重）"""
         result: List[str] = []
-        try:
-            if isinstance(obj, dict):
-                for v in obj.values():
-                    result.extend(self._extract_urls_from_object(v))
-            elif isinstance(obj, list):
-                for item in obj:
-                    result.extend(self._extract_urls_from_object(item))
-            elif isinstance(obj, str):
-                _, links = self._linkify_and_collect(obj)
-                result.extend(links)
-        except Exception:
-            pass
-        # 去重并保持顺序
-        seen: set = set()
-        unique = [x for x in result if not (x in seen or seen.add(x))]
-        return unique
+        stack = [obj]
+        while stack:
+            x = stack.pop()
+            if isinstance(x, dict):
+                # 逆序入栈，保证出栈顺序与原先的深度优先遍历一致
+                stack.extend(reversed(list(x.values())))
+            elif isinstance(x, list):
+                stack.extend(reversed(x))
+            elif isinstance(x, str):
+                result.extend(self._find_links(x))
+        return list(dict.fromkeys(result))
 
     # 将路径/URI 解析为适用于 HTML 的 <img src> 值
     def _resolve_image_src(self, url: str) -> str:
@@ -1036,97 +1434,75 @@ class HTMLRenderer(ProcessorPlugin):
             return url
 
     def _file_uri_to_path(self, uri: str) -> str:
-        try:
-            s = str(uri)
-            if not s.startswith('file://'):
-                return s
-            body = s[7:]
-            while body.startswith('/') and len(body) > 3 and body[2] == ':':
-                body = body[1:]
-            return body.replace('/', '\\') if os.name == 'nt' else body
-        except Exception:
-            return uri
+        """file:// URI -> 本地路径（百分号解码、Windows 盘符由 url2pathname 处理）"""
+        s = str(uri)
+        if not s.startswith('file://'):
+            return s
+        parsed = urlparse(s)
+        path = parsed.path
+        # 兼容 file://./static、file://C:/dir 等非标准写法：netloc 实为路径的一部分
+        if parsed.netloc and parsed.netloc != 'localhost':
+            path = parsed.netloc + path
+        return url2pathname(path)
 
     def _image_to_data_uri(self, path: str) -> str:
         try:
-            mime, _ = mimetypes.guess_type(path)
-            if not mime:
-                # 兜底按 png
-                mime = 'image/png'
-            with open(path, 'rb') as f:
-                b64 = base64.b64encode(f.read()).decode('ascii')
-            return f'data:{mime};base64,{b64}'
+            # 以 (路径, 修改时间, 大小) 为键复用编码结果，文件变更后自动失效
+            st = os.stat(path)
+            return _encode_image_file(os.path.abspath(path), st.st_mtime_ns, st.st_size)
         except Exception:
             return path
 
-    def _get_face_src(self, face_id: str) -> str:
-        """根据 face_id 返回 data-URI 图片，优先从 data/qlottie，其次回退 legacy 资源目录。"""
-        # 缓存
-        if not hasattr(self, '_face_cache'):
-            self._face_cache: Dict[str, str] = {}
-        cached = self._face_cache.get(face_id)
-        if cached:
-            return cached
-
-        # 候选目录与文件名模式
-        candidate_dirs = [
-            Path('static/qlottie'),
-            Path('qlottie'),
-        ]
-        name_patterns = [
-            f"{face_id}.png", f"{face_id}.webp", f"{face_id}.gif",
-            f"face_{face_id}.png", f"sticker_{face_id}.png"
-        ]
-
-        for d in candidate_dirs:
+    def _init_qr_cache_dir(self) -> Optional[str]:
+        """创建二维码磁盘缓存目录，失败时返回 None"""
+        cache_root = getattr(self.settings.system, 'cache_dir', './data/cache')
+        qr_dir = Path(cache_root) / QR_CACHE_SUBDIR
+        try:
+            qr_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            self.logger.warning(f"二维码缓存目录不可用，仅使用内存缓存: {e}")
+            return None
+        return str(qr_dir)
+
+    def _load_static_assets(self) -> Dict[str, str]:
+        """本地静态模式下将常用静态资源预编码为 data URI（键为相对 static 根目录的路径）"""
+        base_url = self.settings.rendering.static_base_url.rstrip('/')
+        if not base_url.startswith('file://'):
+            return {}
+        root = os.path.abspath(self._file_uri_to_path(base_url))
+        cache: Dict[str, str] = {}
+        for sub in STATIC_ASSET_DIRS:
+            directory = os.path.join(root, sub)
             try:
-                if not d.exists():
-                    continue
-                for name in name_patterns:
-                    p = d / name
-                    if p.exists():
-                        mime = 'image/png'
-                        if p.suffix.lower() == '.gif':
-                            mime = 'image/gif'
-                        elif p.suffix.lower() == '.webp':
-                            mime = 'image/webp'
-                        with open(p, 'rb') as f:
-                            b64 = base64.b64encode(f.read()).decode('ascii')
-                        data_uri = f"data:{mime};base64,{b64}"
-                        self._face_cache[face_id] = data_uri
-                        return data_uri
-            except Exception:
+                names = os.listdir(directory)
+            except OSError:
                 continue
+            for name in names:
+                full_path = os.path.join(directory, name)
+                if os.path.isfile(full_path):
+                    cache[f'{sub}/{name}'] = self._image_to_data_uri(full_path)
+        return cache
 
-        # 找不到时返回一个透明占位（1x1 PNG）
-        transparent_png = (
-            'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAA' 
-            'AAC0lEQVR42mP8/x8AAwMCAO2e4eYAAAAASUVORK5CYII='
+    def _find_face_dirs(self) -> Tuple[str, ...]:
+        """返回实际存在的表情资源目录"""
+        return tuple(d for d in FACE_DIR_CANDIDATES if os.path.isdir(d))
+
+    def _get_face_src(self, face_id: str) -> str:
+        """根据 face_id 返回表情图片地址，优先从 static/qlottie，其次回退 legacy 资源目录。
+
+        默认内联为 data URI；rendering.inline_faces 关闭时直接引用表情文件。
+        """
+        rendering = self.settings.rendering
+        return _resolve_face_src(
+            face_id,
+            self._face_dirs,
+            rendering.inline_faces,
+            not rendering.static_base_url.startswith('file://'),
         )
-        data_uri = f"data:image/png;base64,{transparent_png}"
-        self._face_cache[face_id] = data_uri
-        return data_uri
 
     def _qr_data_uri(self, url: str) -> str:
-        """为给定 URL 生成二维码并以 data URI 返回，带缓存。"""
-        if not hasattr(self, '_qr_cache'):
-            self._qr_cache: Dict[str, str] = {}
-        cached = self._qr_cache.get(url)
-        if cached:
-            return cached
-        try:
-            qr = qrcode.QRCode(version=None, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=3, border=0)
-            qr.add_data(url)
-            qr.make(fit=True)
-            img = qr.make_image(fill_color="black", back_color="white")
-            buf = BytesIO()
-            img.save(buf, format='PNG')
-            b64 = base64.b64encode(buf.getvalue()).decode('ascii')
-            data_uri = f"data:image/png;base64,{b64}"
-            self._qr_cache[url] = data_uri
-            return data_uri
-        except Exception:
-            return ''
+        """为给定 URL 生成二维码并以 data URI 返回（进程内 LRU + 磁盘缓存）"""
+        return _make_qr_data_uri(url, self._qr_cache_dir)
 
     def _extract_card_url(self, card: Dict[str, Any]) -> Optional[str]:
         """仿照 gotohtml.sh 的 card_url 逻辑提取跳转 URL。"""
@@ -1140,7 +1516,7 @@ class HTMLRenderer(ProcessorPlugin):
                     return jump
                 text = c.get('contact') or ''
                 if isinstance(text, str):
-                    m = re.search(r'(?:uin=|)(?P<uin>\d{5,})', text)
+                    m = UIN_RE.search(text)
                     if m:
                         return f'https://mp.qzone.qq.com/u/{m.group("uin")}'
                 return None
@@ -1162,25 +1538,21 @@ class HTMLRenderer(ProcessorPlugin):
 
     def _first_entry_value(self, d: Any) -> Dict[str, Any]:
         if isinstance(d, dict) and d:
-            try:
-                # Python 3.7+ preserves insertion order
-                first_key = next(iter(d.keys()))
-                v = d.get(first_key)
-                return v if isinstance(v, dict) else {}
-            except Exception:
-                return {}
+            # Python 3.7+ preserves insertion order
+            v = next(iter(d.values()))
+            return v if isinstance(v, dict) else {}
         return {}
 
     def _file_href(self, path: str) -> str:
         """生成 file:// 超链接，兼容绝对路径（含 Windows 盘符）与相对路径。"""
         if not path:
             return '#'
-        try:
-            p = Path(path)
-            if p.is_absolute():
-                return p.as_uri()
-        except Exception:
-            pass
+        # 先用 os.path 判断，仅绝对路径才构造 Path 对象
+        if os.path.isabs(path):
+            try:
+                return Path(path).as_uri()
+            except ValueError:
+                pass
         # 相对路径：尽力转义
         safe = path.replace('\\', '/')
         return f'file://{quote(safe)}'
@@ -1225,6 +1597,10 @@ class HTMLRenderer(ProcessorPlugin):
                 if attr_value.startswith('@/'):
                     # 移除 @ 前缀
                     resource_path = attr_value[2:]  # 移除 '@/'
+                    # 优先使用初始化时预编码的资源
+                    cached = self._asset_cache.get(resource_path)
+                    if cached:
+                        return cached
                     full_path = os.path.join(local_path, resource_path)
                     
                     # 尝试读取文件并转换为 data URI
@@ -4,38 +4,376 @@ import asyncio
 import os
 import time
 import hashlib
-import base64
+import io
 import mimetypes
-from typing import Dict, Any, List, Optional, Tuple
+import random
+import shelve
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Any, FrozenSet, Iterator, List, Optional, Tuple, Union
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs
 
-from PIL import Image, ImageFile
-from openai import AsyncOpenAI
+import aiofiles
+import httpx
+import openai
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+# 优先使用 SIMD 加速的 pybase64（输出与标准库一致），未安装时回退标准库
+try:
+    from pybase64 import b64encode
+except ImportError:
+    from base64 import b64encode
+
+# 优先使用 orjson 序列化/克隆消息树（C 实现，比标准库 json 快约一倍），未安装时回退标准库
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from config import get_settings
 from core.plugin import ProcessorPlugin
 from utils.common import to_dict
 
-ImageFile.LOAD_TRUNCATED_IMAGES = True
+# 下载图片使用的默认请求头
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'image/*',
+}
+
+# 压缩后图片的最大边长
+IMAGE_MAX_SIZE = (2048, 2048)
+
+# 尺寸已达标且文件小于该值（字节）的图片不再重新编码
+IMAGE_RECOMPRESS_MIN_BYTES = 2 * 1024 * 1024
+
+# 压缩后的二次无损优化工具：扩展名 -> (可执行文件, 参数)
+IMAGE_OPTIMIZERS = {
+    '.jpg': ('jpegoptim', ('--strip-all', '--max=85', '--quiet')),
+    '.jpeg': ('jpegoptim', ('--strip-all', '--max=85', '--quiet')),
+    '.png': ('optipng', ('-o2', '-quiet')),
+}
+
+# 图片审核结果内存缓存的最大条目数（持久化部分存放在 shelve 中）
+AUDIT_CACHE_MAX_ENTRIES = 4096
+
+# 遍历消息树时关注的消息段类型
+IMAGE_SEGMENT_TYPES = frozenset(('image',))
+TEXT_SEGMENT_TYPES = frozenset(('text', 'image'))
+
+# 分析结果中的布尔字段及其缺省值（统一规范为 'true'/'false' 字符串）
+BOOL_FIELD_DEFAULTS = {
+    'needpriv': 'false',
+    'safemsg': 'true',
+    'isover': 'true',
+    'notregular': 'false',
+}
+_BOOL_TEXT = {True: 'true', False: 'false'}
+
+# 分析缓存键的时间分桶（秒）：提示词含当前时间，isover 随最后一条消息距今的时长变化，
+# 跨桶即视为不同输入
+ANALYSIS_CACHE_TIME_BUCKET = 60
+
+# 投稿分析结果内存缓存的最大条目数（持久化部分存放在 shelve 中）
+ANALYSIS_CACHE_MAX_ENTRIES = 1024
+
+# 感知哈希（dHash）汉明距离小于该值时视为同一张图片
+PERCEPTUAL_HASH_THRESHOLD = 4
+
+# 流式下载的分块大小
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+
+# 重试退避的最长等待（秒）
+RETRY_MAX_DELAY = 8.0
+
+# HTTP/2 依赖可选的 h2 包，未安装时回退 HTTP/1.1
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# 图片审核提示词：自由文本格式 / JSON 模式
+VISION_PROMPT = (
+    '请分析这张图片并回答：\n'
+    '1. 安全性：是否含有暴力、色情、政治敏感或攻击性内容？回答 safe 或 unsafe\n'
+    '2. 描述：详细描述图片内容（主要元素、场景、风格等）\n\n'
+    '格式：\n安全性：[safe/unsafe]\n描述：[内容]'
+)
+VISION_JSON_PROMPT = (
+    '请分析这张图片，判断是否含有暴力、色情、政治敏感或攻击性内容，并详细描述图片内容'
+    '（主要元素、场景、风格等）。以JSON返回：{"safe": true/false, "description": "描述"}'
+)
+
+# 投稿分析提示词模板（占位符：now 当前时间戳、input_json 投稿消息 JSON）
+ANALYSIS_PROMPT_TEMPLATE = """当前时间 {now}
+以下内容是一组按时间顺序排列的校园墙投稿聊天记录：
+
+{input_json}
+
+请根据以下标准，提取出这些消息中属于**最后一组投稿**的信息：
+
+### 分组标准
+- 通常以关键词"在吗"、"投稿"、"墙"等开始，但这些关键词可能出现在中途或根本不出现。
+- 属于同一组投稿的消息，时间间隔一般较近（通常小于 600 秒），但也存在例外。
+- 投稿内容可能包含文本、图片（image）、视频（video）、文件（file）、戳一戳（poke）、合并转发的聊天记录（forward）等多种类型。
+- 大多数情况下该记录只包含一组投稿，这种情况下认为所有消息都在组中，偶尔可能有多组，需要你自己判断。
+- 信息只可能包含多个完整的投稿，不可能出现半个投稿+一个投稿的情况，如果真的出现了，说明你判断错误，前面那个"半个投稿"，是后面投稿的一部分。
+
+### 你需要给出的判断
+
+- `needpriv`（是否需要匿名）  
+  - 如果信息中明确表达"匿名"意图或使用谐音字（如："匿"、"腻"、"拟"、"逆"、"🐎"、"🐴"、"马" 等），则为 `true`。  
+  - 当信息仅包含单个含义模糊的字或 emoji 时，也应考虑匿名的可能性。  
+  - 否则为 `false`。
+  - 如果用户明确说了不匿(也可能是不腻，不码，不马之类的谐音内容)，那么一定为`false`
+
+- `safemsg`（投稿是否安全）  
+  - 投稿若包含攻击性言论、辱骂内容、敏感政治信息，应判定为 `false`。  
+  - 否则为 `true`。
+
+- `isover`（投稿是否完整）  
+  - 若投稿者明确表示"发完了"、"没了"、"完毕"等；或投稿语义完整且最后一条消息距离当前时间较远，则为 `true`。  
+  - 若存在"没发完"之类的未结束迹象，或最后消息距当前时间较近且不明确，则为 `false`。
+
+- `notregular`（投稿是否异常）  
+  - 若投稿者明确表示"不合常规"或你主观判断此内容异常，则为 `true`。  
+  - 否则为 `false`。
+
+- `summary`（投稿内容总结）  
+  - 生成一段简洁的投稿内容总结（100-200字），包括：
+    1. 投稿的核心主题或话题
+    2. 主要内容和关键信息
+    3. 情感倾向（正面/负面/中性）
+    4. 是否包含图片、视频等多媒体内容
+  - 总结应客观、准确，便于后续审核和管理使用
+
+### 输出格式
+
+**严格按照下面的 JSON 格式输出**，仅填写最后一组投稿的 `message_id`，不要输出任何额外的文字或说明：
+
+{{
+"needpriv": "true" 或 "false",
+"safemsg": "true" 或 "false",
+"isover": "true" 或 "false",
+"notregular": "true" 或 "false",
+"summary": "投稿内容的简洁总结（100-200字）",
+"messages": [
+    "message_id1",
+    "message_id2",
+    ...
+]
+}}"""
+
+# 提示词在占位符处预先切分为静态片段，每次请求只需按顺序拼接
+_PROMPT_HEAD, _PROMPT_MID, _PROMPT_TAIL = (
+    part.replace('{{', '{').replace('}}', '}')
+    for part in ANALYSIS_PROMPT_TEMPLATE.replace('{input_json}', '{now}').split('{now}')
+)
+
+
+def _is_transient_error(exc: BaseException) -> bool:
+    """判断是否为值得重试的瞬时错误：网络异常、超时、限流、服务端 5xx"""
+    if isinstance(exc, (
+        httpx.TransportError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    )):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+
+def _encode_data_url(mime_type: str, source: Union[bytes, str]) -> str:
+    """将图片内容（字节或文件路径）编码为 base64 data URL"""
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            source = f.read()
+    return f"data:{mime_type};base64,{b64encode(source).decode('ascii')}"
+
+
+# Pillow 按需导入：C 扩展较重，仅在首次处理图片时加载
+_pil_image = None
+
+
+def _load_pil():
+    """导入并返回 PIL.Image 模块（首次调用时开启截断图片容错）"""
+    global _pil_image
+    if _pil_image is None:
+        from PIL import Image, ImageFile
+        ImageFile.LOAD_TRUNCATED_IMAGES = True
+        _pil_image = Image
+    return _pil_image
+
+
+def _json_clone(obj: Any) -> Any:
+    """深拷贝 JSON 结构的数据（消息树）"""
+    if orjson is not None:
+        return orjson.loads(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS))
+    return json.loads(json.dumps(obj))
+
+
+def _json_dumps(obj: Any) -> bytes:
+    """紧凑序列化为 UTF-8 编码的 JSON（不缩进、保留非 ASCII 字符，减少提示词 token）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _json_loads(text: str) -> Any:
+    """解析 JSON 文本"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+# 字段路径树的叶子标记：移除该键
+_REMOVE = None
+
+
+def _compile_field_paths(paths: List[str]) -> Dict[str, Any]:
+    """将点号路径列表编译为路径树，如 ['data.file', 'file'] -> {'data': {'file': None}, 'file': None}"""
+    tree: Dict[str, Any] = {}
+    for path in paths:
+        parts = tuple(path.split('.'))
+        node = tree
+        for part in parts[:-1]:
+            child = node.get(part, {})
+            if child is _REMOVE:
+                # 上层字段已整体移除
+                break
+            node = node.setdefault(part, child)
+        else:
+            node[parts[-1]] = _REMOVE
+    return tree
+
+
+def _strip_fields(obj: Dict[str, Any], tree: Dict[str, Any]) -> Dict[str, Any]:
+    """返回按路径树移除字段后的字典；只复制发生改动的层级，其余子树与原对象共享"""
+    result = obj
+    for key, sub in tree.items():
+        if key not in obj:
+            continue
+        if sub is _REMOVE:
+            if result is obj:
+                result = dict(obj)
+            del result[key]
+            continue
+        child = obj[key]
+        if not isinstance(child, dict):
+            continue
+        new_child = _strip_fields(child, sub)
+        if new_child is not child:
+            if result is obj:
+                result = dict(obj)
+            result[key] = new_child
+    return result
+
+
+def _shallow_clone_event(item: Dict[str, Any]) -> Dict[str, Any]:
+    """浅拷贝消息事件：事件本身、message 列表及其中各消息段（含 data）为新对象，更深层子树共享"""
+    new = dict(item)
+    segments = item.get('message')
+    if isinstance(segments, list):
+        cloned = []
+        for seg in segments:
+            if isinstance(seg, dict):
+                seg = dict(seg)
+                if isinstance(seg.get('data'), dict):
+                    seg['data'] = dict(seg['data'])
+            cloned.append(seg)
+        new['message'] = cloned
+    return new
+
+
+class _RateLimiter:
+    """异步令牌桶限速：每 period 秒最多 max_rate 次请求，允许一次性突发 max_rate 次"""
+
+    def __init__(self, max_rate: float, period: float = 60.0):
+        self.max_rate = max_rate
+        self.rate = max_rate / period
+        self._tokens = max_rate
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """取得一个令牌，令牌不足时等待补充"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.max_rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
 
 
 class LLMProcessor(ProcessorPlugin):
     """LLM处理器 - 处理投稿内容的LLM分析"""
 
+    __slots__ = (
+        # LLM 客户端与调用控制
+        '_openai_http', 'client', 'max_retry', 'text_model', 'vision_model', 'timeout',
+        'json_mode', 'vision_json_mode', 'fast_path_max_messages', '_llm_sem', '_llm_limiter',
+        # 图片下载与处理
+        '_http', 'image_concurrency', '_optimizers', 'skip_image_audit_over_mb', 'image_cache_dir',
+        # 审核与分析缓存
+        '_cache_executor', '_audit_cache', '_audit_shelf', '_phash_cache',
+        'analysis_cache_path', 'analysis_cache_ttl', '_analysis_cache', '_analysis_shelf',
+        '_analysis_inflight',
+        # 消息清理规则
+        'hide_rules', 'remove_rules',
+        '_llm_default_tree', '_llm_trees', '_output_default_tree', '_output_trees',
+    )
+
     def __init__(self):
         settings = get_settings()
         config = to_dict(settings.llm)
         super().__init__("llm_processor", config)
 
-        # 初始化异步LLM客户端
+        # 初始化异步LLM客户端：Vision 审核与投稿分析共用一个连接池（可用时启用 HTTP/2 多路复用）
+        # 重试统一由 _with_retry 按 max_retry 处理，关闭 SDK 内置重试以免次数叠加
+        self._openai_http = DefaultAsyncHttpxClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        )
         self.client = AsyncOpenAI(
             api_key=self.config.get('api_key'),
-            base_url=self.config.get('base_url', 'https://api.openai.com/v1')
+            base_url=self.config.get('base_url', 'https://api.openai.com/v1'),
+            max_retries=0,
+            http_client=self._openai_http,
         )
+        self.max_retry = max(1, int(self.config.get('max_retry') or 3))
         self.text_model = self.config.get('text_model', 'gpt-4o-mini')
         self.vision_model = self.config.get('vision_model', self.text_model)
         self.timeout = self.config.get('timeout', 30)
+        # 每次调用都会用到的开关，在初始化时读取一次
+        self.json_mode = bool(self.config.get('json_mode', True))
+        self.vision_json_mode = bool(self.config.get('vision_json_mode', False))
+        self.fast_path_max_messages = int(self.config.get('fast_path_max_messages', 0))
+
+        # LLM 调用协调：并发上限 + 每分钟请求数限速（避免突发流量触发 429）
+        self._llm_sem = asyncio.Semaphore(max(1, int(self.config.get('llm_concurrency', 8))))
+        llm_rpm = int(self.config.get('llm_rpm', 60))
+        self._llm_limiter: Optional[_RateLimiter] = _RateLimiter(llm_rpm) if llm_rpm > 0 else None
+        # 下载图片共用的长连接客户端（initialize 中创建）
+        self._http: Optional[httpx.AsyncClient] = None
+        # 单个投稿内并发处理的图片数
+        self.image_concurrency = max(1, int(self.config.get('image_concurrency', 8)))
+
+        # 图片二次优化工具（仅启用已安装的工具）
+        self._optimizers: Dict[str, Tuple[str, Tuple[str, ...]]] = {}
+        if self.config.get('postprocess_optimize', True):
+            for ext, (tool, args) in IMAGE_OPTIMIZERS.items():
+                exe = shutil.which(tool)
+                if exe:
+                    self._optimizers[ext] = (exe, args)
 
         # 图片审核配置
         self.skip_image_audit_over_mb = float(getattr(settings.audit, 'skip_image_audit_over_mb', 0.0))
@@ -45,6 +383,23 @@ class LLMProcessor(ProcessorPlugin):
         self.image_cache_dir = Path(cache_root) / 'chat_images'
         self.image_cache_dir.mkdir(parents=True, exist_ok=True)
 
+        # shelve 磁盘缓存的读写为阻塞 I/O 且非线程安全，统一交给单线程执行器串行处理
+        self._cache_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='llm-cache')
+
+        # 图片审核结果缓存：内容 sha1 -> (is_safe, description)
+        self._audit_cache: Dict[str, Tuple[bool, str]] = {}
+        self._audit_shelf: Optional[shelve.Shelf] = None
+        # 感知哈希 -> 审核结果，用于命中被重新编码过的相同图片
+        self._phash_cache: Dict[int, Tuple[bool, str]] = {}
+
+        # 投稿分析结果缓存：sha1(模型 + 时间桶 + 输入) -> (写入时间, 分析结果)，默认关闭
+        self.analysis_cache_path = Path(cache_root) / 'llm_cache'
+        self.analysis_cache_ttl = int(self.config.get('analysis_cache_ttl', 0))
+        self._analysis_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._analysis_shelf: Optional[shelve.Shelf] = None
+        # 进行中的投稿分析：缓存键 -> 任务
+        self._analysis_inflight: Dict[str, asyncio.Future] = {}
+
         # 消息清理规则
         self._init_cleaning_rules()
 
@@ -64,33 +419,130 @@ class LLMProcessor(ProcessorPlugin):
             'image': ['data.file_id', 'data.file_size', 'summary'],
         }
 
+        # 预编译为按消息类型合并后的路径树，清理时每个节点只需一趟
+        global_rules = self.remove_rules.get('global', [])
+        types = (set(self.hide_rules) | set(self.remove_rules)) - {'global'}
+        # LLM输入：隐藏字段 + 永久移除字段
+        self._llm_default_tree = _compile_field_paths(global_rules)
+        self._llm_trees = {
+            t: _compile_field_paths(
+                global_rules + self.hide_rules.get(t, []) + self.remove_rules.get(t, [])
+            )
+            for t in types
+        }
+        # 输出：仅永久移除字段（不移除仅用于隐藏的字段）
+        self._output_default_tree = self._llm_default_tree
+        self._output_trees = {
+            t: _compile_field_paths(
+                global_rules
+                + [f for f in self.remove_rules.get(t, []) if f not in self.hide_rules.get(t, [])]
+            )
+            for t in types
+        }
+
     async def initialize(self):
         """初始化处理器"""
+        self._get_http_client()
+        try:
+            self._audit_shelf = await self._cache_io(shelve.open, str(self.image_cache_dir / 'audit.shelf'))
+        except Exception as e:
+            self.logger.warning(f"打开图片审核缓存失败，仅使用内存缓存: {e}")
+        if self.analysis_cache_ttl > 0:
+            try:
+                self._analysis_shelf = await self._cache_io(shelve.open, str(self.analysis_cache_path))
+                await self._cache_io(self._purge_analysis_cache)
+            except Exception as e:
+                self.logger.warning(f"打开投稿分析缓存失败，已禁用: {e}")
+                self._analysis_shelf = None
         self.logger.info("LLM处理器初始化完成")
 
     async def shutdown(self):
         """关闭处理器"""
-        pass
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._audit_shelf is not None:
+            await self._cache_io(self._audit_shelf.close)
+            self._audit_shelf = None
+        if self._analysis_shelf is not None:
+            await self._cache_io(self._analysis_shelf.close)
+            self._analysis_shelf = None
+        self._cache_executor.shutdown(wait=True)
+        await self._openai_http.aclose()
+
+    async def _cache_io(self, func, *args):
+        """在缓存执行器线程中执行 shelve 读写，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._cache_executor, func, *args)
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """获取共用的HTTP客户端（复用连接，同一图床主机的图片无需重复握手）"""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                timeout=self.timeout,
+                headers=DEFAULT_HEADERS,
+            )
+        return self._http
+
+    @asynccontextmanager
+    async def _llm_slot(self):
+        """占用一个 LLM 调用名额（Vision 审核与投稿分析共用）"""
+        async with self._llm_sem:
+            if self._llm_limiter is not None:
+                await self._llm_limiter.acquire()
+            yield
+
+    async def _with_retry(self, action: str, func, *args, **kwargs):
+        """执行异步调用，瞬时错误按 max_retry 重试（指数退避 + 随机抖动），其他错误直接抛出"""
+        for attempt in range(self.max_retry):
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                if attempt + 1 >= self.max_retry or not _is_transient_error(e):
+                    raise
+                delay = min(RETRY_MAX_DELAY, 2 ** attempt) * (0.5 + random.random() / 2)
+                self.logger.warning(f"{action}失败 (尝试 {attempt + 1}/{self.max_retry})，{delay:.1f} 秒后重试: {e}")
+                await asyncio.sleep(delay)
+
+    async def _request_completion(self, **kwargs) -> str:
+        """占用 LLM 调用名额请求一次补全并返回文本（stream=True 时收集流式响应）"""
+        async with self._llm_slot():
+            if kwargs.get('stream'):
+                stream = await self.client.chat.completions.create(**kwargs)
+                parts = []
+                async for chunk in stream:
+                    if chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                return ''.join(parts)
+            resp = await self.client.chat.completions.create(**kwargs)
+            return resp.choices[0].message.content or ""
 
     # ==================== 主流程 ====================
     
     async def process(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """处理投稿数据：图片处理 -> LLM分析 -> 生成结果"""
         messages = data.get('messages', [])
-        if not messages:
+        if not isinstance(messages, list) or not messages:
             return data
 
         # 1. 处理图片（下载、压缩、安全检查）
         images_safe = await self._process_all_images(messages)
 
-        # 2. 准备LLM输入（清理敏感字段）
+        # 2. 准备LLM输入（清理敏感字段），并建立 message_id 查找表
         lm_messages, original_messages = self._prepare_messages_for_llm(messages)
+        lookup = self._index_messages(original_messages)
         
-        # 3. 调用LLM分析
-        llm_result = await self._analyze_with_llm(lm_messages, data.get('notregular'))
+        # 3. 调用LLM分析（满足条件的纯图片小投稿直接使用缺省结果）
+        llm_result = self._try_fast_path(messages, data.get('notregular'), images_safe)
+        if llm_result is None:
+            llm_result = await self._analyze_with_llm(
+                lm_messages, data.get('notregular'), use_cache=not data.get('fresh_analysis')
+            )
         
         # 4. 构建最终结果
-        final_messages = self._build_final_messages(llm_result, original_messages)
+        final_messages = self._build_final_messages(llm_result, original_messages, lookup)
         
         # 5. 组装返回数据
         llm_result['messages'] = final_messages
@@ -106,39 +558,60 @@ class LLMProcessor(ProcessorPlugin):
     # ==================== 图片处理 ====================
     
     async def _process_all_images(self, messages: List[Dict[str, Any]]) -> bool:
-        """处理所有图片：下载、压缩、安全检查"""
-        all_safe = True
-        
-        for msg in self._iter_message_nodes(messages):
-            if msg.get('type') != 'image':
-                continue
-                
+        """处理所有图片：下载、压缩、安全检查（多张图片并发处理）"""
+        # 同一投稿内重复引用的图片（如再次转发）按地址合并，只下载、压缩、审核一次
+        targets: Dict[str, List[Tuple[Dict[str, Any], Dict[str, Any]]]] = {}
+        for msg in self._iter_message_nodes(messages, IMAGE_SEGMENT_TYPES):
             data = msg.get('data', {})
             url = data.get('url') or data.get('file', '')
-            if not url:
-                continue
-            
-            try:
-                # 处理图片URL（下载远程图片或获取本地路径）
-                image_path, original_size = await self._get_image_path(url, data)
-                if not image_path:
-                    continue
-                
-                # 压缩图片
-                self._compress_image(image_path)
-                
-                # 安全检查（根据原始大小决定是否跳过）
-                if self._should_audit_image(original_size):
-                    is_safe, description = await self._check_image_safety(image_path)
-                    if not is_safe:
-                        all_safe = False
-                    if description:
-                        msg['describe'] = description
-                        
-            except Exception as e:
-                self.logger.error(f"处理图片失败 {url}: {e}")
-        
-        return all_safe
+            if url:
+                targets.setdefault(url, []).append((msg, data))
+        if not targets:
+            return True
+
+        sem = asyncio.Semaphore(self.image_concurrency)
+
+        async def _one(url: str, refs: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> bool:
+            async with sem:
+                try:
+                    # 处理图片URL（下载远程图片或获取本地路径）
+                    image_path, original_size = await self._get_image_path(url, refs[0][1])
+                    if not image_path:
+                        return True
+                    # 其余引用直接复制首个引用解析出的本地路径，不再重复解析/下载
+                    first = refs[0][1]
+                    for _, data in refs[1:]:
+                        if 'origin_url' in first:
+                            data.setdefault('origin_url', first['origin_url'])
+                        data['url'] = first['url']
+
+                    # 按原始内容计算哈希，内容相同的图片复用审核结果
+                    should_audit = self._should_audit_image(original_size)
+                    digest = await asyncio.to_thread(self._file_digest, image_path) if should_audit else ''
+
+                    # 压缩图片（保留压缩后的字节，审核时无需再读盘）
+                    image_bytes = await self._compress_image(image_path)
+
+                    # 安全检查（根据原始大小决定是否跳过）
+                    if should_audit:
+                        # 压缩会原地改写文件，再次下载同一图片时命中的是压缩后的缓存文件，
+                        # 因此审核结果同时按压缩前后两份内容哈希记录
+                        if image_bytes is not None:
+                            stored = await asyncio.to_thread(self._bytes_digest, image_bytes)
+                        else:
+                            stored = await asyncio.to_thread(self._file_digest, image_path)
+                        digests = tuple(dict.fromkeys(d for d in (digest, stored) if d))
+                        is_safe, description = await self._audit_image(image_path, digests, image_bytes)
+                        if description:
+                            for msg, _ in refs:
+                                msg['describe'] = description
+                        return is_safe
+                except Exception as e:
+                    self.logger.error(f"处理图片失败 {url}: {e}")
+                return True
+
+        results = await asyncio.gather(*(_one(*t) for t in targets.items()), return_exceptions=True)
+        return all(r is not False for r in results)
 
     async def _get_image_path(self, url: str, data: dict) -> Tuple[str, int]:
         """获取图片本地路径，下载远程图片"""
@@ -179,40 +652,114 @@ class LLMProcessor(ProcessorPlugin):
         if local_path.exists():
             return str(local_path), local_path.stat().st_size
         
-        # 下载图片
+        # 下载图片（瞬时错误按 max_retry 重试）
         try:
-            import httpx
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                'Accept': 'image/*',
-            }
-            
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                resp = await client.get(url, headers=headers)
+            return await self._with_retry(f"下载图片({url})", self._fetch_image, url, basename, local_path)
+        except Exception as e:
+            self.logger.warning(f"下载图片失败 {url}: {e}")
+            return "", 0
+
+    async def _fetch_image(self, url: str, basename: str, local_path: Path) -> Tuple[str, int]:
+        """流式下载一次图片到缓存目录，失败时清理临时文件并抛出异常"""
+        tmp_path = None
+        try:
+            async with self._get_http_client().stream('GET', url) as resp:
                 resp.raise_for_status()
-                
+
                 # 根据Content-Type纠正扩展名
                 ctype = resp.headers.get('Content-Type', '')
                 if 'image/' in ctype:
                     new_ext = '.' + ctype.split('/')[-1].split(';')[0]
                     if new_ext in {'.jpeg', '.png', '.gif', '.webp'}:
                         local_path = self.image_cache_dir / f"{basename}{new_ext}"
-                
-                local_path.write_bytes(resp.content)
-                return str(local_path), len(resp.content)
-                
+
+                # 边接收边写盘，先写临时文件，完整下载后再改名，避免残缺文件被当作缓存复用
+                tmp_path = local_path.with_name(local_path.name + '.part')
+                size = 0
+                async with aiofiles.open(tmp_path, 'wb') as f:
+                    async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        size += len(chunk)
+                        await f.write(chunk)
+
+            os.replace(tmp_path, local_path)
+            return str(local_path), size
+        except BaseException:
+            if tmp_path is not None:
+                try:
+                    tmp_path.unlink()
+                except OSError:
+                    pass
+            raise
+
+    async def _compress_image(self, path: str) -> Optional[bytes]:
+        """压缩图片到合理尺寸（解码/编码为 CPU 密集操作，在线程池中执行）
+
+        返回与磁盘文件一致的压缩后字节；压缩失败或经外部工具二次优化后返回 None，需重新读盘。
+        仅对重新编码过的图片执行二次优化，未改写的原图保持原样。
+        """
+        data, rewritten = await asyncio.to_thread(self._compress_image_sync, path)
+        if rewritten and await self._optimize_image(path):
+            return None
+        return data
+
+    async def _optimize_image(self, path: str) -> bool:
+        """调用 jpegoptim/optipng 进一步压缩图片，减小送审时的 base64 体积；返回优化是否成功完成"""
+        optimizer = self._optimizers.get(Path(path).suffix.lower())
+        if not optimizer:
+            return False
+        exe, args = optimizer
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                exe, *args, path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            try:
+                returncode = await asyncio.wait_for(proc.wait(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                self.logger.warning(f"优化图片超时 {path}")
+                return False
         except Exception as e:
-            self.logger.warning(f"下载图片失败 {url}: {e}")
-            return "", 0
+            self.logger.warning(f"优化图片失败 {path}: {e}")
+            return False
+        # jpegoptim/optipng 先写临时文件再替换，仅正常退出时文件才会被改写
+        return returncode == 0
 
-    def _compress_image(self, path: str):
-        """压缩图片到合理尺寸"""
+    def _compress_image_sync(self, path: str) -> Tuple[Optional[bytes], bool]:
+        """压缩图片到合理尺寸（同步实现），返回 (文件内容, 是否重新编码并改写了文件)，失败时内容为 None"""
         try:
+            Image = _load_pil()
+            # 与按路径保存一致：输出格式由扩展名决定
+            fmt = Image.registered_extensions().get(Path(path).suffix.lower())
+            buf = io.BytesIO()
             with Image.open(path) as im:
-                im.thumbnail((2048, 2048))
-                im.save(path)
+                fmt = fmt or im.format
+                if (
+                    im.format == fmt
+                    and im.width <= IMAGE_MAX_SIZE[0]
+                    and im.height <= IMAGE_MAX_SIZE[1]
+                    and os.path.getsize(path) < IMAGE_RECOMPRESS_MIN_BYTES
+                ):
+                    # 已经足够小：只读了文件头，直接返回原始内容，跳过解码与重新编码
+                    with open(path, 'rb') as f:
+                        return f.read(), False
+                if im.format == 'JPEG':
+                    # 让 libjpeg 在解码时直接按 1/2、1/4、1/8 缩小，避免完整解码超大图
+                    im.draft('RGB', IMAGE_MAX_SIZE)
+                    im.thumbnail(IMAGE_MAX_SIZE, Image.Resampling.LANCZOS)
+                    im.save(buf, format=fmt, optimize=True, progressive=True, quality=85)
+                else:
+                    im.thumbnail(IMAGE_MAX_SIZE, Image.Resampling.LANCZOS)
+                    im.save(buf, format=fmt)
+            data = buf.getvalue()
+            with open(path, 'wb') as f:
+                f.write(data)
+            return data, True
         except Exception as e:
             self.logger.warning(f"压缩图片失败 {path}: {e}")
+            return None, False
 
     def _should_audit_image(self, size_bytes: int) -> bool:
         """判断是否需要审核图片"""
@@ -221,30 +768,138 @@ class LLMProcessor(ProcessorPlugin):
         threshold = int(self.skip_image_audit_over_mb * 1024 * 1024)
         return size_bytes < threshold
 
-    async def _check_image_safety(self, path: str) -> Tuple[bool, str]:
-        """使用Vision模型检查图片安全性并生成描述"""
-        if not os.path.exists(path):
+    @staticmethod
+    def _bytes_digest(data: bytes) -> str:
+        """计算内存中图片内容的 sha1"""
+        return hashlib.sha1(data).hexdigest()
+
+    @staticmethod
+    def _file_digest(path: str) -> str:
+        """计算文件内容的 sha1，文件不存在时返回空串"""
+        h = hashlib.sha1()
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+                    h.update(chunk)
+        except OSError:
+            return ''
+        return h.hexdigest()
+
+    @staticmethod
+    def _image_dhash(source: Union[str, io.BytesIO]) -> Optional[int]:
+        """计算图片（路径或内存字节流）的 64 位差值哈希（dHash），无法解码或近乎纯色时返回 None"""
+        try:
+            Image = _load_pil()
+            with Image.open(source) as im:
+                im.draft('L', (64, 64))
+                px = im.convert('L').resize((9, 8), Image.Resampling.LANCZOS).tobytes()
+        except Exception:
+            return None
+        # 近乎纯色的图片哈希几乎全为 0，彼此都会“相近”，不参与感知哈希匹配
+        if max(px) - min(px) < 8:
+            return None
+        bits = 0
+        for row in range(0, 72, 9):
+            for col in range(row, row + 8):
+                bits = (bits << 1) | (px[col] > px[col + 1])
+        return bits
+
+    def _lookup_phash(self, phash: int) -> Optional[Tuple[bool, str]]:
+        """在感知哈希缓存中查找相近图片的审核结果"""
+        for known, result in self._phash_cache.items():
+            if bin(known ^ phash).count('1') < PERCEPTUAL_HASH_THRESHOLD:
+                return result
+        return None
+
+    async def _audit_image(
+        self,
+        path: str,
+        digests: Tuple[str, ...],
+        data: Optional[bytes] = None
+    ) -> Tuple[bool, str]:
+        """审核图片：先按内容哈希、再按感知哈希复用历史结果，均未命中才调用 Vision 模型
+
+        digests 为图片内容的 sha1（压缩前、压缩后，内容未变时只有一个），任一命中即复用，
+        结果会补记到其余哈希下；data 为图片文件的当前内容（可选），提供时不再读盘。
+        """
+        for i, digest in enumerate(digests):
+            cached = self._audit_cache.get(digest)
+            if cached is None and self._audit_shelf is not None:
+                cached = await self._cache_io(self._read_audit_shelf, digest)
+                if cached is not None:
+                    self._remember_audit(self._audit_cache, digest, cached)
+            if cached is not None:
+                await self._store_audit(digests[:i] + digests[i + 1:], cached)
+                return cached
+
+        phash = await asyncio.to_thread(self._image_dhash, io.BytesIO(data) if data is not None else path)
+        if phash is not None:
+            cached = self._lookup_phash(phash)
+            if cached is not None:
+                await self._store_audit(digests, cached)
+                return cached
+
+        is_safe, description = await self._check_image_safety(path, data)
+        # 审核失败时描述为空，不缓存以便下次重试
+        if description:
+            result = (is_safe, description)
+            if phash is not None:
+                self._remember_audit(self._phash_cache, phash, result)
+            await self._store_audit(digests, result)
+        return is_safe, description
+
+    async def _store_audit(self, digests: Tuple[str, ...], result: Tuple[bool, str]):
+        """按内容哈希记录审核结果（内存缓存 + 持久化）"""
+        for digest in digests:
+            self._remember_audit(self._audit_cache, digest, result)
+            if self._audit_shelf is not None:
+                await self._cache_io(self._write_audit_shelf, digest, result)
+
+    def _read_audit_shelf(self, digest: str) -> Optional[Tuple[bool, str]]:
+        """读取持久化的图片审核结果（在缓存执行器线程中调用）"""
+        try:
+            return self._audit_shelf.get(digest)
+        except Exception as e:
+            self.logger.warning(f"读取图片审核缓存失败: {e}")
+            return None
+
+    def _write_audit_shelf(self, digest: str, result: Tuple[bool, str]):
+        """持久化图片审核结果（在缓存执行器线程中调用）"""
+        try:
+            self._audit_shelf[digest] = result
+        except Exception as e:
+            self.logger.warning(f"写入图片审核缓存失败: {e}")
+
+    @staticmethod
+    def _remember_audit(cache: Dict[Any, Tuple[bool, str]], key: Any, result: Tuple[bool, str]):
+        """写入内存审核缓存，超出上限时淘汰最早的条目"""
+        if len(cache) >= AUDIT_CACHE_MAX_ENTRIES:
+            cache.pop(next(iter(cache)))
+        cache[key] = result
+
+    async def _check_image_safety(self, path: str, data: Optional[bytes] = None) -> Tuple[bool, str]:
+        """使用Vision模型检查图片安全性并生成描述（data 为已在内存中的图片内容，可省去读盘）"""
+        if data is None and not os.path.exists(path):
             return True, ""
 
-        # 准备图片数据
+        # 准备图片数据（读盘与 base64 编码在线程池中执行，不阻塞事件循环）
         mime_type, _ = mimetypes.guess_type(path)
         if not mime_type:
             mime_type = 'image/jpeg'
+
+        data_url = await asyncio.to_thread(_encode_data_url, mime_type, data if data is not None else path)
         
-        with open(path, 'rb') as f:
-            b64_data = base64.b64encode(f.read()).decode('ascii')
-        
-        data_url = f"data:{mime_type};base64,{b64_data}"
-        
-        prompt = (
-            '请分析这张图片并回答：\n'
-            '1. 安全性：是否含有暴力、色情、政治敏感或攻击性内容？回答 safe 或 unsafe\n'
-            '2. 描述：详细描述图片内容（主要元素、场景、风格等）\n\n'
-            '格式：\n安全性：[safe/unsafe]\n描述：[内容]'
-        )
-        
+        if self.vision_json_mode:
+            prompt = VISION_JSON_PROMPT
+            options = {'response_format': {'type': 'json_object'}}
+        else:
+            prompt = VISION_PROMPT
+            options = {}
+
         try:
-            response = await self.client.chat.completions.create(
+            text = await self._with_retry(
+                "图片安全检查",
+                self._request_completion,
                 model=self.vision_model,
                 messages=[{
                     "role": "user",
@@ -254,140 +909,156 @@ class LLMProcessor(ProcessorPlugin):
                     ]
                 }],
                 temperature=0.0,
-                max_tokens=1000
+                max_tokens=1000,
+                **options,
             )
-            
-            text = response.choices[0].message.content or ""
-            is_safe = 'unsafe' not in text.lower()
-            
-            # 提取描述
-            description = ""
-            if '描述：' in text:
-                description = text.split('描述：', 1)[1].strip()
-            else:
-                lines = [l.strip() for l in text.splitlines() if l.strip()]
-                for line in lines:
-                    if 'safe' not in line.lower() and not line.startswith('安全性'):
-                        description = line
-                        break
-            
-            return is_safe, description
-            
+            return self._parse_vision_reply(text)
+
         except Exception as e:
             self.logger.error(f"图片安全检查失败: {e}")
             return True, ""
 
-    def _iter_message_nodes(self, messages: List[Dict[str, Any]]):
-        """迭代所有消息节点"""
-        for item in messages:
+    @staticmethod
+    def _parse_vision_reply(text: str) -> Tuple[bool, str]:
+        """解析 Vision 模型的回复：优先按 JSON 解析，否则按“安全性/描述”文本格式提取"""
+        stripped = text.strip()
+        if stripped.startswith('{'):
+            try:
+                result = _json_loads(stripped)
+            except ValueError:
+                result = None
+            if isinstance(result, dict):
+                safe = result.get('safe', True)
+                if isinstance(safe, str):
+                    safe = safe.strip().lower() not in ('false', 'unsafe')
+                return bool(safe), str(result.get('description') or '').strip()
+
+        is_safe = 'unsafe' not in text.lower()
+
+        # 提取描述
+        description = ""
+        if '描述：' in text:
+            description = text.split('描述：', 1)[1].strip()
+        else:
+            lines = [l.strip() for l in text.splitlines() if l.strip()]
+            for line in lines:
+                if 'safe' not in line.lower() and not line.startswith('安全性'):
+                    description = line
+                    break
+
+        return is_safe, description
+
+    def _iter_message_nodes(
+        self,
+        messages: List[Dict[str, Any]],
+        types: Optional[FrozenSet[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """迭代所有消息节点（显式栈深度优先遍历，按出现顺序产出；指定 types 时只产出这些类型）"""
+        stack: List[Any] = list(reversed(messages))
+        while stack:
+            item = stack.pop()
             if not isinstance(item, dict):
                 continue
-            if 'message' in item and isinstance(item['message'], list):
-                yield from self._iter_message_nodes(item['message'])
-            elif 'type' in item:
+            children = item.get('message')
+            if isinstance(children, list):
+                stack.extend(reversed(children))
+            elif types is None:
+                if 'type' in item:
+                    yield item
+            elif item.get('type') in types:
                 yield item
 
     # ==================== LLM分析 ====================
     
-    def _prepare_messages_for_llm(self, messages: List[Dict[str, Any]]) -> Tuple[List[Dict], List[Dict]]:
-        """准备LLM输入：清理敏感字段"""
-        original = json.loads(json.dumps(messages))
-        cleaned = json.loads(json.dumps(messages))
-        
-        for msg in self._iter_message_nodes(cleaned):
-            msg_type = msg.get('type')
-            
-            # 应用隐藏规则（仅对LLM输入）
-            if msg_type in self.hide_rules:
-                for field in self.hide_rules[msg_type]:
-                    self._remove_field(msg, field)
-            
-            # 应用永久移除规则
-            for field in self.remove_rules.get('global', []):
-                self._remove_field(msg, field)
-            
-            if msg_type in self.remove_rules:
-                for field in self.remove_rules[msg_type]:
-                    self._remove_field(msg, field)
-        
-        return cleaned, original
-
-    def _remove_field(self, obj: dict, field_path: str):
-        """移除对象中的字段（支持点号路径）"""
-        parts = field_path.split('.')
-        current = obj
-        
-        for i, part in enumerate(parts[:-1]):
-            if not isinstance(current, dict) or part not in current:
-                return
-            current = current[part]
-        
-        if isinstance(current, dict):
-            current.pop(parts[-1], None)
-
-    async def _analyze_with_llm(self, messages: List[Dict], notregular: Any) -> Dict[str, Any]:
-        """调用LLM分析投稿"""
-        input_data = {"notregular": notregular, "messages": messages}
-        input_json = json.dumps(input_data, ensure_ascii=False, indent=2)
-        
-        prompt = f"""当前时间 {time.time()}
-以下内容是一组按时间顺序排列的校园墙投稿聊天记录：
-
-{input_json}
-
-请根据以下标准，提取出这些消息中属于**最后一组投稿**的信息：
-
-### 分组标准
-- 通常以关键词"在吗"、"投稿"、"墙"等开始，但这些关键词可能出现在中途或根本不出现。
-- 属于同一组投稿的消息，时间间隔一般较近（通常小于 600 秒），但也存在例外。
-- 投稿内容可能包含文本、图片（image）、视频（video）、文件（file）、戳一戳（poke）、合并转发的聊天记录（forward）等多种类型。
-- 大多数情况下该记录只包含一组投稿，这种情况下认为所有消息都在组中，偶尔可能有多组，需要你自己判断。
-- 信息只可能包含多个完整的投稿，不可能出现半个投稿+一个投稿的情况，如果真的出现了，说明你判断错误，前面那个"半个投稿"，是后面投稿的一部分。
+    def _try_fast_path(
+        self,
+        messages: List[Dict[str, Any]],
+        notregular: Any,
+        images_safe: bool
+    ) -> Optional[Dict[str, Any]]:
+        """条数不超过 fast_path_max_messages 且只含已审核安全图片的投稿无需 LLM 判断，返回缺省分析结果
 
-### 你需要给出的判断
+        没有文本即无匿名意图与文本安全问题可判断；任一图片未审核（无描述）或不安全时仍走 LLM。
+        """
+        limit = self.fast_path_max_messages
+        if limit <= 0 or len(messages) > limit or not images_safe or notregular:
+            return None
+        descriptions = []
+        for msg in self._iter_message_nodes(messages):
+            desc = msg.get('describe') if msg.get('type') == 'image' else None
+            if not desc:
+                return None
+            descriptions.append(desc)
+        if not descriptions:
+            return None
+        self.logger.debug(f"纯图片投稿（{len(messages)} 条）跳过 LLM 分析")
+        result = self._get_default_result()
+        result['summary'] = '；'.join(descriptions)[:200]
+        return result
 
-- `needpriv`（是否需要匿名）  
-  - 如果信息中明确表达"匿名"意图或使用谐音字（如："匿"、"腻"、"拟"、"逆"、"🐎"、"🐴"、"马" 等），则为 `true`。  
-  - 当信息仅包含单个含义模糊的字或 emoji 时，也应考虑匿名的可能性。  
-  - 否则为 `false`。
-  - 如果用户明确说了不匿(也可能是不腻，不码，不马之类的谐音内容)，那么一定为`false`
+    def _prepare_messages_for_llm(self, messages: List[Dict[str, Any]]) -> Tuple[List[Dict], List[Dict]]:
+        """准备LLM输入：清理敏感字段
 
-- `safemsg`（投稿是否安全）  
-  - 投稿若包含攻击性言论、辱骂内容、敏感政治信息，应判定为 `false`。  
-  - 否则为 `true`。
+        LLM输入只用于序列化，未改动的子树直接与原消息共享，不整体拷贝；
+        原消息在构建输出时才按需拷贝。
+        """
+        cleaned = self._strip_messages(messages, self._llm_trees, self._llm_default_tree)
+        return cleaned, messages
 
-- `isover`（投稿是否完整）  
-  - 若投稿者明确表示"发完了"、"没了"、"完毕"等；或投稿语义完整且最后一条消息距离当前时间较远，则为 `true`。  
-  - 若存在"没发完"之类的未结束迹象，或最后消息距当前时间较近且不明确，则为 `false`。
+    def _strip_messages(
+        self,
+        items: List[Any],
+        trees: Dict[str, Dict[str, Any]],
+        default_tree: Dict[str, Any]
+    ) -> List[Any]:
+        """按消息类型对应的路径树清理消息列表（递归处理 message 嵌套），返回新列表"""
+        out = []
+        for item in items:
+            if isinstance(item, dict):
+                if 'message' in item and isinstance(item['message'], list):
+                    item = dict(item)
+                    item['message'] = self._strip_messages(item['message'], trees, default_tree)
+                elif 'type' in item:
+                    item = _strip_fields(item, trees.get(item.get('type'), default_tree))
+            out.append(item)
+        return out
 
-- `notregular`（投稿是否异常）  
-  - 若投稿者明确表示"不合常规"或你主观判断此内容异常，则为 `true`。  
-  - 否则为 `false`。
+    async def _analyze_with_llm(
+        self,
+        messages: List[Dict],
+        notregular: Any,
+        use_cache: bool = True
+    ) -> Dict[str, Any]:
+        """调用LLM分析投稿（use_cache=False 时忽略已缓存结果与进行中的请求，强制重新分析）"""
+        input_data = {"notregular": notregular, "messages": messages}
+        input_bytes = _json_dumps(input_data)
 
-- `summary`（投稿内容总结）  
-  - 生成一段简洁的投稿内容总结（100-200字），包括：
-    1. 投稿的核心主题或话题
-    2. 主要内容和关键信息
-    3. 情感倾向（正面/负面/中性）
-    4. 是否包含图片、视频等多媒体内容
-  - 总结应客观、准确，便于后续审核和管理使用
+        # 相同输入在同一时间桶、有效期内直接复用分析结果（直接对序列化结果求摘要，无需再次编码）
+        bucket = int(time.time() // ANALYSIS_CACHE_TIME_BUCKET)
+        hasher = hashlib.sha1(f'{self.text_model}\n{bucket}\n'.encode('utf-8'))
+        hasher.update(input_bytes)
+        cache_key = hasher.hexdigest()
+        if not use_cache:
+            # 与合并请求路径一致：调用方拿到独立副本，修改不会影响缓存
+            return _json_clone(await self._run_analysis(input_bytes.decode('utf-8'), cache_key))
 
-### 输出格式
+        cached = await self._recall_analysis(cache_key)
+        if cached is not None:
+            return cached
 
-**严格按照下面的 JSON 格式输出**，仅填写最后一组投稿的 `message_id`，不要输出任何额外的文字或说明：
+        # 相同输入的并发分析合并为一次请求，各调用方拿到独立副本
+        task = self._analysis_inflight.get(cache_key)
+        if task is None:
+            # 仅在确需请求时才解码为提示词文本
+            task = asyncio.ensure_future(self._run_analysis(input_bytes.decode('utf-8'), cache_key))
+            self._analysis_inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._analysis_inflight.pop(cache_key, None))
+        result = await asyncio.shield(task)
+        return _json_clone(result)
 
-{{
-"needpriv": "true" 或 "false",
-"safemsg": "true" 或 "false",
-"isover": "true" 或 "false",
-"notregular": "true" 或 "false",
-"summary": "投稿内容的简洁总结（100-200字）",
-"messages": [
-    "message_id1",
-    "message_id2",
-    ...
-]
-}}"""
+    async def _run_analysis(self, input_json: str, cache_key: str) -> Dict[str, Any]:
+        """构建提示词并请求LLM分析，结果写入缓存；失败时返回默认结果"""
+        prompt = ''.join((_PROMPT_HEAD, str(time.time()), _PROMPT_MID, input_json, _PROMPT_TAIL))
 
         try:
             result = await self._call_llm_json(prompt)
@@ -395,52 +1066,113 @@ class LLMProcessor(ProcessorPlugin):
                 return self._get_default_result()
             
             # 标准化布尔值
-            for key in ['needpriv', 'safemsg', 'isover', 'notregular']:
+            for key, default in BOOL_FIELD_DEFAULTS.items():
                 val = result.get(key)
-                if isinstance(val, bool):
-                    result[key] = 'true' if val else 'false'
-                elif isinstance(val, str):
+                if isinstance(val, str):
                     result[key] = 'true' if val.strip().lower() == 'true' else 'false'
+                elif isinstance(val, bool):
+                    result[key] = _BOOL_TEXT[val]
                 else:
-                    result[key] = 'false' if key in ('needpriv', 'notregular') else 'true'
-            
+                    result[key] = default
+
+            if self.analysis_cache_ttl > 0:
+                # 内存缓存持有私有副本，返回给调用方的对象无论如何修改都不会写回缓存
+                self._remember_analysis(cache_key, (time.time(), _json_clone(result)))
+                await self._cache_io(self._set_cached_analysis, cache_key, result)
             return result
             
         except Exception as e:
             self.logger.error(f"LLM分析失败: {e}")
             return self._get_default_result()
 
+    async def _recall_analysis(self, key: str) -> Optional[Dict[str, Any]]:
+        """依次查询内存与磁盘缓存，返回未过期投稿分析结果的独立副本"""
+        if self.analysis_cache_ttl <= 0:
+            return None
+        entry = self._analysis_cache.get(key)
+        if entry is not None:
+            if time.time() - entry[0] <= self.analysis_cache_ttl:
+                return _json_clone(entry[1])
+            del self._analysis_cache[key]
+        entry = await self._cache_io(self._get_cached_analysis, key)
+        if entry is None:
+            return None
+        self._remember_analysis(key, entry)
+        return _json_clone(entry[1])
+
+    def _remember_analysis(self, key: str, entry: Tuple[float, Dict[str, Any]]):
+        """写入内存分析缓存，超出上限时淘汰最早的条目"""
+        if len(self._analysis_cache) >= ANALYSIS_CACHE_MAX_ENTRIES:
+            self._analysis_cache.pop(next(iter(self._analysis_cache)))
+        self._analysis_cache[key] = entry
+
+    def _get_cached_analysis(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """读取未过期的投稿分析缓存条目 (写入时间, 结果)（在缓存执行器线程中调用）"""
+        if self._analysis_shelf is None:
+            return None
+        try:
+            entry = self._analysis_shelf.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.analysis_cache_ttl:
+                del self._analysis_shelf[key]
+                return None
+            return entry
+        except Exception as e:
+            self.logger.warning(f"读取投稿分析缓存失败: {e}")
+            return None
+
+    def _set_cached_analysis(self, key: str, result: Dict[str, Any]):
+        """写入投稿分析结果（在缓存执行器线程中调用）"""
+        if self._analysis_shelf is None:
+            return
+        try:
+            self._analysis_shelf[key] = (time.time(), result)
+        except Exception as e:
+            self.logger.warning(f"写入投稿分析缓存失败: {e}")
+
+    def _purge_analysis_cache(self):
+        """清理已过期的投稿分析结果"""
+        now = time.time()
+        expired = [
+            key for key, (stored_at, _) in self._analysis_shelf.items()
+            if now - stored_at > self.analysis_cache_ttl
+        ]
+        for key in expired:
+            del self._analysis_shelf[key]
+
     def _get_default_result(self) -> Dict[str, Any]:
         """获取默认分析结果"""
         return {
-            'needpriv': 'false',
-            'safemsg': 'true',
-            'isover': 'true',
-            'notregular': 'false',
+            **BOOL_FIELD_DEFAULTS,
             'summary': '',
             'messages': []
         }
 
     async def _call_llm_json(self, prompt: str) -> Optional[Dict[str, Any]]:
         """调用LLM并返回JSON"""
+        messages = [
+            {'role': 'system', 'content': '你是校园墙投稿管理员，只返回规范JSON'},
+            {'role': 'user', 'content': prompt}
+        ]
         try:
-            stream = await self.client.chat.completions.create(
+            if self.json_mode:
+                # JSON 模式：单次非流式请求，由服务端保证返回合法 JSON
+                options = {'response_format': {'type': 'json_object'}}
+            else:
+                options = {'stream': True}
+            text = await self._with_retry(
+                "LLM调用",
+                self._request_completion,
                 model=self.text_model,
-                messages=[
-                    {'role': 'system', 'content': '你是校园墙投稿管理员，只返回规范JSON'},
-                    {'role': 'user', 'content': prompt}
-                ],
-                stream=True,
+                messages=messages,
+                # 分类任务结果可缓存复用，使用确定性输出
+                temperature=0.0,
                 timeout=1000,
+                **options,
             )
-            
-            # 收集流式响应
-            text = ""
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    text += chunk.choices[0].delta.content
-            
-            return json.loads(text.strip())
+
+            return _json_loads(text.strip())
             
         except Exception as e:
             self.logger.error(f"LLM调用失败: {e}")
@@ -448,47 +1180,39 @@ class LLMProcessor(ProcessorPlugin):
 
     # ==================== 结果构建 ====================
     
-    def _build_final_messages(self, llm_result: Dict, original_messages: List[Dict]) -> List[Dict]:
+    @staticmethod
+    def _index_messages(messages: List[Dict]) -> Dict[str, Dict]:
+        """构建 message_id（字符串形式）-> 消息 的查找表"""
+        return {str(msg.get('message_id')): msg for msg in messages if msg.get('message_id')}
+
+    def _build_final_messages(
+        self,
+        llm_result: Dict,
+        original_messages: List[Dict],
+        lookup: Optional[Dict[str, Dict]] = None
+    ) -> List[Dict]:
         """根据LLM结果构建最终消息列表"""
-        # 构建message_id查找表
-        lookup = {str(msg.get('message_id')): msg for msg in original_messages if msg.get('message_id')}
-        
-        # 提取选中的消息
+        if lookup is None:
+            lookup = self._index_messages(original_messages)
+
+        # 提取选中的消息；如果没有选中任何消息，返回全部
         selected_ids = llm_result.get('messages', [])
-        final_messages = []
-        
-        for msg_id in selected_ids:
-            if str(msg_id) in lookup:
-                final_messages.append(self._clean_for_output(lookup[str(msg_id)]))
-        
-        # 如果没有选中任何消息，返回全部
-        if not final_messages:
-            final_messages = [self._clean_for_output(msg) for msg in original_messages]
-        
-        return final_messages
+        selected = [msg for msg in map(lookup.get, map(str, selected_ids)) if msg is not None]
+        return self._clean_for_output(selected or original_messages)
 
-    def _clean_for_output(self, message: Dict) -> Dict:
-        """清理输出消息（仅移除永久删除的字段）"""
-        cleaned = json.loads(json.dumps(message))
-        
-        for msg in self._iter_message_nodes([cleaned]):
-            for field in self.remove_rules.get('global', []):
-                self._remove_field(msg, field)
-            
-            msg_type = msg.get('type')
-            if msg_type in self.remove_rules:
-                for field in self.remove_rules[msg_type]:
-                    # 不移除仅用于隐藏的字段
-                    if msg_type not in self.hide_rules or field not in self.hide_rules[msg_type]:
-                        self._remove_field(msg, field)
-        
-        return cleaned
+    def _clean_for_output(self, messages: List[Dict]) -> List[Dict]:
+        """批量清理输出消息（仅移除永久删除的字段）
+
+        只复制后续可能修改的外层结构，字符串等不可变值及更深层子树与原消息共享。
+        """
+        stripped = self._strip_messages(messages, self._output_trees, self._output_default_tree)
+        return [_shallow_clone_event(msg) if isinstance(msg, dict) else msg for msg in stripped]
 
     def _extract_text_segments(self, messages: List[Dict], limit: int = 200) -> List[str]:
         """提取文本段落"""
         texts = []
         
-        for msg in self._iter_message_nodes(messages):
+        for msg in self._iter_message_nodes(messages, TEXT_SEGMENT_TYPES):
             msg_type = msg.get('type')
             
             if msg_type == 'text':
@@ -500,13 +1224,9 @@ class LLMProcessor(ProcessorPlugin):
                 if desc:
                     texts.append(desc)
         
-        # 合并文本并切分
-        merged = '\n'.join(texts).strip()
-        if not merged:
+        if not texts:
             return []
-        
-        segments = []
-        for i in range(0, len(merged), limit):
-            segments.append(merged[i:i+limit])
-        
-        return segments
+
+        # 合并文本并按长度切分
+        merged = '\n'.join(texts)
+        return [merged[i:i + limit] for i in range(0, len(merged), limit)]
@@ -59,11 +59,12 @@ class ProcessingPipeline:
         await self.html_renderer.shutdown()
         await self.content_renderer.shutdown()
         
-    async def process_submission(self, submission_id: int) -> bool:
+    async def process_submission(self, submission_id: int, fresh_analysis: bool = False) -> bool:
         """处理投稿
         
         Args:
             submission_id: 投稿ID
+            fresh_analysis: 是否忽略LLM分析缓存，强制重新分析
             
         Returns:
             处理是否成功
@@ -101,7 +102,8 @@ class ProcessingPipeline:
                     'messages': messages,
                     'is_anonymous': submission.is_anonymous,
                     'watermark_text': await self.get_watermark_text(submission.group_name),
-                    'wall_mark': (await self.get_wall_mark(submission.group_name)) or submission.group_name or 'Graffito'
+                    'wall_mark': (await self.get_wall_mark(submission.group_name)) or submission.group_name or 'Graffito',
+                    'fresh_analysis': fresh_analysis
                 }
                 
                 # 执行处理管道
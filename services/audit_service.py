@@ -363,7 +363,7 @@ class AuditService:
         await asyncio.sleep(180)  # 等待3分钟
         
         # 重新处理
-        success = await self.pipeline.process_submission(submission_id)
+        success = await self.pipeline.process_submission(submission_id, fresh_analysis=True)
         
         return {
             'success': success,
@@ -374,7 +374,7 @@ class AuditService:
     @audit_command('刷新', '刷新投稿信息')
     async def refresh(self, submission_id: int, operator_id: str, extra: Optional[str] = None) -> Dict[str, Any]:
         """刷新处理"""
-        success = await self.pipeline.process_submission(submission_id)
+        success = await self.pipeline.process_submission(submission_id, fresh_analysis=True)
         
         return {
             'success': success,